@@ -21,6 +21,15 @@ from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds, Brai
 from brainflow.data_filter import DataFilter, FilterTypes, AggOperations, DetrendOperations #WindowFunctions, 
 from pythonosc import udp_client, osc_message_builder
 
+from acquisition import BoardStream
+from band_power import BandPowerLog, BandPowerStage
+from frame_worker import FrameWorker
+from latency import LatencyMonitor
+from osc_output import OSCStream
+from ring_buffer import RingBuffer
+from streaming_filter import StreamingFilter
+from timeseries_view import FrameTimer, add_timeseries_curve
+
 openframeworks_ip = "127.0.0.1"
 openframeworks_port = 9000
 #client = udp_client.SimpleUDPClient(openframeworks_ip, openframeworks_port)
@@ -28,28 +37,55 @@ openframeworks_port = 9000
 #ch1 = osc_message_builder.OscMessageBuilder(address="/data/ch1")
 
 class Graph:
-    def __init__(self, board_shim):
+    def __init__(self, board_shim, band_log_path=None, latency_log_path=None):
         self.board_id = board_shim.get_board_id()
         self.board_shim = board_shim
         channels_use = BoardShim.get_exg_channels(self.board_id)
         self.exg_channels = channels_use[0:len(channels_use)-1]
         self.sampling_rate = BoardShim.get_sampling_rate(self.board_id)
-        self.update_speed_ms = 50 #timerの更新時間感覚（ms）
+        self.update_speed_ms = 30 #描画timerの更新時間感覚（ms）
+        self.process_interval_ms = 50 #取得・フィルタ・帯域パワー・OSC送信の間隔（ms）
         self.window_size = 4
         self.num_points = self.window_size * self.sampling_rate
 
+        self.stream = BoardStream(board_shim)
+        self.stream.register("plot")
+        self.filter = StreamingFilter(len(self.exg_channels), self.sampling_rate)
+        self.filtered = RingBuffer(len(self.exg_channels), self.num_points + self.sampling_rate)
+        self.x = np.arange(self.filtered.capacity, dtype=np.float64)#全カーブ共通のx軸 (確保は1回だけ)
+
+        # 帯域パワー (delta/theta/alpha/beta/gamma) を band_hop サンプルごとに計算
+        self.band_hop = self.sampling_rate // 10
+        self.band_powers = BandPowerStage(
+            len(self.exg_channels), self.sampling_rate, self.num_points, self.band_hop
+        )
+        # OSC送信: ソケットを使い回し、バックグラウンドスレッドから送る
+        self.osc = OSCStream(openframeworks_ip, openframeworks_port, threaded=True)
+        self.band_powers.subscribe(self.send_band_powers)
+        self.avg_bands = self.band_powers.average()#チャンネル平均の帯域パワー (オーバーレイに表示)
+        self.band_log = None
+        if band_log_path is not None:
+            self.band_log = BandPowerLog(band_log_path, self.band_powers)
+
         print(self.sampling_rate)
 
         self.app = QApplication([])
         self.win = pg.GraphicsLayoutWidget(show=True,title='BrainFlow Plot',size=(2000, 1000))
 
+        # ステージごとの処理時間 (p50/p95/p99) をオーバーレイに表示、latency_log_path に10秒ごとに記録
+        self.latency = LatencyMonitor(enabled=True, dump_path=latency_log_path)
+
+        # 処理はワーカースレッド、GUIは最新のフレームだけを描画 (古いフレームは捨てる)
+        self.worker = FrameWorker(self.process, self.process_interval_ms / 1000, monitor=self.latency)
         self._init_timeseries()
 
+        self.worker.start()
         timer = QtCore.QTimer()
         timer.timeout.connect(self.update)#タイマーによってupdateを定期的に呼び出す
         timer.start(self.update_speed_ms)
 
         QApplication.instance().exec()
+        self.worker.stop()
 
 
     def _init_timeseries(self): #ボード、グラフの初期化、タイマーの設定
@@ -65,36 +101,51 @@ class Graph:
             p.setXRange(self.sampling_rate,self.num_points+self.sampling_rate,padding=0)
             if i == 0:
                 p.setTitle('TimeSeries Plot')
+                self.frame_timer = FrameTimer(p, extra=self.format_overlay)#描画時間・fps・処理時間・ドロップ数・帯域パワーの表示
             self.plots.append(p)
-            curve = p.plot()
+            curve = add_timeseries_curve(p)#clip-to-view + peakダウンサンプリング
             self.curves.append(curve)
 
+    def process(self): #ワーカースレッドで実行、描画する窓を返す
+        with self.latency.stage("acquire"):
+            new_data = self.stream.read("plot")#前回から増えた分だけ取得
+        self.latency.gauge("chunk", new_data.shape[1])
+        if new_data.shape[1] == 0:
+            return None
+        #filter (2-49Hz バンドパス, 48-52Hz バンドストップ)
+        with self.latency.stage("filter"):
+            filtered = self.filter.process(new_data[self.exg_channels])
+            self.filtered.extend(filtered)
+        with self.latency.stage("band_power"):
+            self.band_powers.update(filtered)
+        # 新しいサンプルだけを全チャンネル1つのバンドルで送信 (/data/ch1, /data/ch2, ...)
+        with self.latency.stage("osc"):
+            self.osc.send_samples("/data", filtered)
+        self.latency.gauge("osc_queue", len(self.osc.queue))
+
+        self.avg_bands = self.band_powers.average()#新しい配列を代入するのでGUIスレッドからそのまま読める
+
+        sample_time = new_data[self.stream.timestamp_channel, -1]#最新サンプルのボードタイムスタンプ
+        return self.filtered.get().copy(), sample_time#リングバッファは書き続けられるのでコピーを渡す
+
     def update(self):
-        data = self.board_shim.get_current_board_data(self.num_points+self.sampling_rate)#num_points分データを取得？samplingrate分足してるのは？
-        # datanow = data[-4000:-1,self.exg_channels]
-        avg_bands = [0, 0, 0, 0, 0]
-        #filter
-        for count, channel in enumerate(self.exg_channels):
-            # plot timeseries
-            DataFilter.detrend(data[channel], DetrendOperations.CONSTANT.value)
-            DataFilter.perform_bandpass(data[channel], self.sampling_rate, 2.0, 49.0, 2,
-                                        FilterTypes.BUTTERWORTH.value, 0)
-            #DataFilter.perform_bandpass(data[channel], self.sampling_rate, 26.0, 50.0, 2,
-            #                            FilterTypes.BUTTERWORTH.value, 0)
-            #4-50Hzをバンドストップにしているのはなぜ？
-            DataFilter.perform_bandstop(data[channel], self.sampling_rate, 48.0, 52.0, 2,
-                                        FilterTypes.BUTTERWORTH.value, 0)
-            #DataFilter.perform_bandstop(data[channel], self.sampling_rate, 4.0, 50.0, 2,
-            #                            FilterTypes.BUTTERWORTH.value, 0)
-            self.curves[count].setData(data[channel].tolist()) #カーブオブジェクトでの波形の表示
-
-            #if count == 1:
-            #    send_osc_message("/data/ch1", data[channel].tolist())
-
-            #ch1.add_arg(data[channel].tolist())
-            #ch1 = ch1.build()
-
-        self.app.processEvents()#eventを処理してグラフが更新されるように
+        frame = self.worker.take()
+        if frame is None:
+            return
+
+        self.frame_timer.start()
+        data, sample_time = frame
+        x = self.x[:data.shape[1]]
+        with self.latency.stage("render"):
+            for count, channel in enumerate(self.exg_channels):
+                # plot timeseries
+                self.curves[count].setData(x, data[count]) #リストに変換せず配列のまま渡す
+
+                #ch1.add_arg(data[channel].tolist())
+                #ch1 = ch1.build()
+
+        self.latency.record("end_to_end", (time.time() - sample_time) * 1000)#サンプル到着から描画まで
+        self.frame_timer.stop()
         
         # OSCメッセージの作成
         #message.add_arg(data.tolist())  # データを追加（ここでは例として42を使用）
@@ -104,16 +155,15 @@ class Graph:
         # メッセージを送信
         #client.send_message(message)
 
-def send_osc_message(address, data):
-    # OSC通信先の設定
-    openframeworks_ip = "127.0.0.1"  # OpenFrameworksのIPアドレス
-    openframeworks_port = 9000  # OpenFrameworksのポート番号
-
-    # OSCクライアントの作成
-    client = udp_client.SimpleUDPClient(openframeworks_ip, openframeworks_port)
+    def format_overlay(self):
+        bands = " ".join(
+            f"{name} {power:.1f}"
+            for name, power in zip(self.band_powers.band_names, self.avg_bands)
+        )
+        return f"{self.worker.format()}\n{bands}"
 
-    # OSCメッセージの送信
-    client.send_message(address, data)
+    def send_band_powers(self, timestamp, band_powers):
+        self.osc.send_message("/bands", band_powers.mean(axis=0))#チャンネル平均を送信
 
 
 def main():
@@ -128,16 +178,21 @@ def main():
     subname = "saitou1" #保存の名前を変える
     ####
 
+    g = None
     try:
         board_shim = BoardShim(BoardIds.CYTON_BOARD, params)
         #board_shim = BoardShim(0, params)
         board_shim.prepare_session()
         board_shim.start_stream() #ストリームの開始
-        g = Graph(board_shim) #グラフクラスへボードストリームをセットする
+        g = Graph(board_shim, band_log_path=subname+"_bands.bin", latency_log_path=subname+"_latency.csv") #グラフクラスへボードストリームをセットする
     except BaseException as e:
         logging.warning('Exception', exc_info=True)#エラーが出た際のログの表示
     finally:
         logging.info('End')
+        if g is not None:
+            g.osc.close()
+            if g.band_log is not None:
+                g.band_log.close()
         if board_shim.is_prepared():
             row_data = board_shim.get_board_data() #save data
             DataFilter.write_file(row_data, subname+".csv", 'w')  # use 'a' for append mode
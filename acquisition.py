@@ -0,0 +1,84 @@
+import time
+import logging
+import numpy as np
+
+from brainflow.board_shim import BoardShim
+
+from ring_buffer import RingBuffer
+
+
+class BoardStream:
+    # Pulls only the samples that arrived since the last poll out of BrainFlow's
+    # ring buffer (without removing them, so get_board_data() still returns the
+    # whole session) and keeps a read cursor per consumer.
+    def __init__(self, board_shim, history_seconds=30):
+        self.board_shim = board_shim
+        self.board_id = board_shim.get_board_id()
+        self.sampling_rate = BoardShim.get_sampling_rate(self.board_id)
+        self.timestamp_channel = BoardShim.get_timestamp_channel(self.board_id)
+        self.num_rows = BoardShim.get_num_rows(self.board_id)
+
+        self.history = RingBuffer(self.num_rows, history_seconds * self.sampling_rate)
+        self.total_samples = 0  # sequence number of the next sample
+        self.last_timestamp = -np.inf
+        self.last_poll = None
+        self.cursors = {}
+
+    def register(self, name):
+        # A new consumer starts with the samples that arrive after registration
+        self.cursors[name] = self.total_samples
+        return name
+
+    def unregister(self, name):
+        self.cursors.pop(name, None)
+
+    def poll(self):
+        now = time.monotonic()
+        if self.last_poll is None:
+            num_samples = self.history.capacity
+        else:
+            # Ask for a bit more than the elapsed time should have produced
+            num_samples = int((now - self.last_poll) * self.sampling_rate * 1.5) + 16
+
+        while True:
+            num_samples = min(num_samples, self.history.capacity)
+            data = self.board_shim.get_current_board_data(num_samples)
+            start = np.searchsorted(
+                data[self.timestamp_channel], self.last_timestamp, side="right"
+            )
+            # Every returned sample is new: there may be more, fetch again
+            if start > 0 or data.shape[1] < num_samples:
+                break
+            if num_samples >= self.history.capacity:
+                break
+            num_samples *= 2
+
+        self.last_poll = now
+        num_new = data.shape[1] - start
+        if num_new > 0:
+            self.history.extend(data[:, start:])
+            self.total_samples += num_new
+            self.last_timestamp = data[self.timestamp_channel, -1]
+
+        return num_new
+
+    def read(self, name, poll=True):
+        # Returns (num_rows, n) with the samples since this consumer's last read.
+        # The result is a view into the history buffer: copy it (e.g. into the
+        # consumer's own RingBuffer) before the next poll.
+        if poll:
+            self.poll()
+
+        num_available = self.total_samples - self.cursors[name]
+        if num_available > len(self.history):
+            logging.warning(
+                f"{name}: {num_available - len(self.history)} samples dropped, "
+                "consumer fell behind the stream history"
+            )
+            num_available = len(self.history)
+
+        self.cursors[name] = self.total_samples
+        return self.history.get(num_available)
+
+    def backlog(self, name):
+        return self.total_samples - self.cursors[name]
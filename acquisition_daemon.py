@@ -0,0 +1,160 @@
+import argparse
+import logging
+import signal
+import threading
+
+from brainflow.board_shim import (
+    BoardShim,
+    BrainFlowInputParams,
+    BoardIds,
+    BrainFlowError,
+)
+
+from playback import PlaybackBoard
+from shared_ring import SharedRing
+
+# Owns the board and publishes every sample into a shared memory ring, so any
+# number of viewers (record_eeg.py, plot_psd.py, plot_fft.py, ...) can attach
+# with --shared-memory NAME at the same time.
+#
+#   python acquisition_daemon.py --serial-port /dev/cu.usbserial-XXXX
+#   python acquisition_daemon.py --board-id -1                  # synthetic board
+#   python acquisition_daemon.py --board-id -3 --file rec.csv   # BrainFlow playback
+#   python acquisition_daemon.py --playback data/xxx/eeg_data.bin --speed 4
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--board-id",
+        type=int,
+        help="board id, check docs to get a list of supported boards",
+        required=False,
+        default=BoardIds.CYTON_BOARD,
+    )
+    parser.add_argument(
+        "--serial-port", type=str, help="serial port", required=False, default=""
+    )
+    parser.add_argument(
+        "--file",
+        type=str,
+        help="recording for the playback board (--board-id -3)",
+        required=False,
+        default="",
+    )
+    parser.add_argument(
+        "--master-board",
+        type=int,
+        help="board the playback file was recorded with",
+        required=False,
+        default=BoardIds.CYTON_BOARD,
+    )
+    parser.add_argument(
+        "--playback",
+        type=str,
+        help="replay a recorded eeg_data.csv / .bin (any recorder layout)",
+        required=False,
+        default="",
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        help="playback speed, 0 for as fast as possible",
+        required=False,
+        default=1.0,
+    )
+    parser.add_argument(
+        "--responses",
+        type=str,
+        help="response_data.csv to inject as markers during playback",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--name",
+        type=str,
+        help="shared memory name viewers attach to",
+        required=False,
+        default="openbci",
+    )
+    parser.add_argument(
+        "--buffer-seconds",
+        type=int,
+        help="seconds of data kept in the ring",
+        required=False,
+        default=60,
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        help="seconds between reads from the board",
+        required=False,
+        default=0.02,
+    )
+    parser.add_argument("--log", action="store_true")
+    return parser.parse_args()
+
+
+def run(board, name, buffer_seconds, interval, stop_event):
+    board_id = board.get_board_id()
+    sampling_rate = BoardShim.get_sampling_rate(board_id)
+    ring = SharedRing.create(
+        name,
+        BoardShim.get_num_rows(board_id),
+        buffer_seconds * sampling_rate,
+        board_id,
+        sampling_rate,
+    )
+    logging.info(f"Publishing board {board_id} to shared memory '{name}'")
+
+    try:
+        while not stop_event.wait(interval):
+            # The ring is the only consumer, so BrainFlow's buffer can be drained
+            ring.extend(board.get_board_data())
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.log:
+        BoardShim.enable_dev_board_logger()
+    else:
+        BoardShim.disable_board_logger()
+
+    params = BrainFlowInputParams()
+    params.serial_port = args.serial_port
+    params.file = args.file
+    params.master_board = args.master_board
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    if args.playback:
+        board = PlaybackBoard(
+            args.playback,
+            speed=args.speed or None,
+            response_path=args.responses,
+        )
+    else:
+        board = BoardShim(args.board_id, params)
+    try:
+        board.prepare_session()
+        board.start_stream()
+        run(board, args.name, args.buffer_seconds, args.interval, stop_event)
+    except KeyboardInterrupt:
+        pass
+    except BrainFlowError:
+        logging.warning("Exception", exc_info=True)
+    finally:
+        if board.is_prepared():
+            board.stop_stream()
+            board.release_session()
+        logging.info("Session released")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import os
+import json
+import shutil
+import hashlib
+import inspect
+import logging
+
+import numpy as np
+import mne
+
+CACHE_DIR = "./.cache"
+MAX_BYTES = 2 * 1024**3
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    # Content-addressed store for intermediate analysis results. The key of an
+    # entry is a hash of the source files' contents, the source code of the
+    # processing steps (so editing a filter band or tmin invalidates it), the
+    # MNE / NumPy versions and any extra parameters. Steps are functions or
+    # whole modules: pass the local modules the steps call into as well, since
+    # only the source that is listed is hashed. An entry is a directory with Raw objects as
+    # <name>_raw.fif, Epochs as <name>-epo.fif and arrays as <name>.npy.
+    # Entries are touched on every hit and the least recently used ones are
+    # removed once the cache is larger than max_bytes.
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, "hashes.json")
+        os.makedirs(directory, exist_ok=True)
+
+    def _read_index(self):
+        try:
+            with open(self.index_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def source_hash(self, path):
+        # Hashes are remembered per (size, mtime), so unchanged recordings are
+        # not read again on every run
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+
+        index = self._read_index()
+        entry = index.get(path)
+        if entry is not None and entry["signature"] == signature:
+            return entry["hash"]
+
+        digest = file_hash(path)
+        index[path] = {"signature": signature, "hash": digest}
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(index, file)
+        os.replace(temp_path, self.index_path)
+        return digest
+
+    def key(self, sources, steps, **params):
+        digest = hashlib.sha256()
+        for path in sources:
+            digest.update(self.source_hash(path).encode())
+        for step in steps:
+            digest.update(inspect.getsource(step).encode())
+        params = {**params, "mne": mne.__version__, "numpy": np.__version__}
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key):
+        # dict of the stored artifacts, or None on a miss. Raw is opened
+        # without preloading (read from disk on demand), arrays are memory-mapped
+        path = self._entry_path(key)
+        try:
+            with open(os.path.join(path, "manifest.json")) as file:
+                manifest = json.load(file)
+
+            artifacts = {}
+            for name, kind in manifest.items():
+                if kind == "raw":
+                    artifacts[name] = mne.io.read_raw_fif(
+                        os.path.join(path, f"{name}_raw.fif"), verbose=False
+                    )
+                elif kind == "epochs":
+                    artifacts[name] = mne.read_epochs(
+                        os.path.join(path, f"{name}-epo.fif"), verbose=False
+                    )
+                elif kind == "none":
+                    artifacts[name] = None
+                else:
+                    artifacts[name] = np.load(
+                        os.path.join(path, f"{name}.npy"), mmap_mode="r"
+                    )
+            os.utime(path)
+        except (OSError, ValueError):
+            # Missing, or removed by another process while reading
+            return None
+
+        return artifacts
+
+    def store(self, key, **artifacts):
+        path = self._entry_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(temp_path, exist_ok=True)
+
+        manifest = {}
+        for name, value in artifacts.items():
+            if isinstance(value, mne.io.BaseRaw):
+                value.save(
+                    os.path.join(temp_path, f"{name}_raw.fif"),
+                    fmt="double",
+                    overwrite=True,
+                    verbose=False,
+                )
+                manifest[name] = "raw"
+            elif isinstance(value, mne.BaseEpochs):
+                value.save(
+                    os.path.join(temp_path, f"{name}-epo.fif"),
+                    fmt="double",
+                    overwrite=True,
+                    verbose=False,
+                )
+                manifest[name] = "epochs"
+            elif value is None:
+                manifest[name] = "none"
+            else:
+                np.save(os.path.join(temp_path, f"{name}.npy"), np.asarray(value))
+                manifest[name] = "array"
+
+        with open(os.path.join(temp_path, "manifest.json"), "w") as file:
+            json.dump(manifest, file)
+
+        try:
+            os.rename(temp_path, path)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+        self.evict()
+
+    def get_or_compute(self, key, compute):
+        # compute() returns a dict of artifacts, stored on a miss
+        artifacts = self.load(key)
+        if artifacts is not None:
+            return artifacts
+        artifacts = compute()
+        self.store(key, **artifacts)
+        return artifacts
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir() or entry.name.endswith(".tmp"):
+                continue
+            try:
+                size = sum(
+                    file.stat().st_size
+                    for file in os.scandir(entry.path)
+                    if file.is_file()
+                )
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue  # evicted by another process
+            entries.append((mtime, size, entry.path))
+            total += size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logging.info(f"Evicting {path} from the analysis cache")
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
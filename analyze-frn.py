@@ -3,19 +3,37 @@ import pandas as pd
 import numpy as np
 import mne
 
-def create_raw_from_csv_pick(file_path, sfreq):
-    data = pd.read_csv(file_path, header=None, sep="\t")
-
-    print(f"Data shape before filtering: {data.shape}")
+import event_alignment
+import session_file
+from analysis_cache import AnalysisCache
+from event_alignment import (
+    MARKER_CORRECT,
+    MARKER_INCORRECT,
+    align_events,
+    events_from_markers,
+)
+from session_file import find_data_file, load_channels, read_session
 
-    picks_columns = [8]  # Corresponding to "Cz"
+def create_raw_from_csv_pick(file_path, sfreq):
+    if file_path.endswith(".bin"):
+        # Binary sessions carry their layout, so pick by header name rather than
+        # by position (recorders differ in where timestamps and markers go)
+        session = read_session(file_path)
+        if session.timestamp_column is None:
+            raise ValueError(
+                f"{file_path} has no timestamp column, events cannot be aligned"
+            )
+        columns = [session.timestamp_column, "channel_8"]  # Corresponding to "Cz"
+    else:
+        columns = [0, 8]  # timestamp, "Cz"
 
-    timestamps = data.iloc[:, 0].values
-    data = data.iloc[:, picks_columns]
+    # Timestamp row first, the picked channel after it. Both are views into
+    # one (channels, times) buffer that RawArray uses as is
+    data = load_channels(file_path, columns, sep="\t")
+    timestamps = data[0]
+    data = data[1:]
     print(f"Data shape after filtering: {data.shape}")
 
-    data = data.values.T
-
     ch_names = ["Cz"]
     ch_types = ["eeg"] * len(ch_names)
 
@@ -29,12 +47,10 @@ def create_raw_from_csv_pick(file_path, sfreq):
     return raw, timestamps
 
 def create_raw_from_csv(file_path, sfreq):
-    data = pd.read_csv(file_path, header=None, sep="\t")
+    data = load_channels(file_path, sep="\t")
 
     print(f"Data shape: {data.shape}")
 
-    data = data.values.T
-
     ch_names = [
         "N/A",  # First channel is not connected
         "O2",
@@ -66,18 +82,30 @@ def filter_raw(raw):
     return raw
 
 
-def create_epochs(raw, response_path, timestamps, sfreq):
-    response_df = pd.read_csv(response_path, header=0)
+def load_markers(file_path):
+    # Marker channel of sessions recorded with BoardShim.insert_marker, or None
+    if not file_path.endswith(".bin"):
+        return None
+    markers = read_session(file_path).markers
+    if markers is None or not np.any(markers):
+        return None
+    return markers
 
-    start_time = timestamps[0]
-    events = []
 
-    for _, row in response_df.iterrows():
-        event_time = row["reaction_times"]
-        sample_index = np.argmin(np.abs(timestamps - event_time)) # Find the closest timestamp sample
-        events.append([sample_index, 0, int(row["correct_responses"])])
-
-    events = np.array(events)
+def create_epochs(raw, response_path, timestamps, sfreq, markers=None):
+    if markers is not None:
+        events = events_from_markers(
+            markers, {MARKER_CORRECT: 1, MARKER_INCORRECT: 0}
+        )
+    else:
+        # Older sessions: match response times to the board timestamps
+        response_df = pd.read_csv(response_path, header=0)
+        events = align_events(
+            timestamps,
+            response_df["reaction_times"].values,
+            response_df["correct_responses"].values,
+            sfreq,
+        )
 
     event_id = dict(Correct=1, Incorrect=0)
 
@@ -97,6 +125,42 @@ def create_epochs(raw, response_path, timestamps, sfreq):
     return epochs
 
 
+def load_filtered_raw(file_path, sfreq, cache):
+    # create_raw_from_csv_pick + filter_raw, cached on the recording's contents
+    def compute():
+        raw, timestamps = create_raw_from_csv_pick(file_path, sfreq)
+        return {"raw": filter_raw(raw), "timestamps": timestamps}
+
+    steps = [create_raw_from_csv_pick, filter_raw, session_file]
+    key = cache.key([file_path], steps, sfreq=sfreq)
+    result = cache.get_or_compute(key, compute)
+    return result["raw"], result["timestamps"]
+
+
+def load_epochs(file_path, response_path, sfreq, cache):
+    # Epochs of a session, cached on the recording, the response file and the
+    # code of every step that produced them
+    def compute():
+        raw, timestamps = load_filtered_raw(file_path, sfreq, cache)
+        markers = load_markers(file_path)
+        epochs = create_epochs(raw, response_path, timestamps, sfreq, markers=markers)
+        return {"epochs": epochs}
+
+    sources = [file_path]
+    if os.path.exists(response_path):
+        sources.append(response_path)
+    steps = [
+        create_raw_from_csv_pick,
+        filter_raw,
+        load_markers,
+        create_epochs,
+        session_file,
+        event_alignment,
+    ]
+    key = cache.key(sources, steps, sfreq=sfreq)
+    return cache.get_or_compute(key, compute)["epochs"]
+
+
 def plot_selected_channels(raw, picks=None):
     if picks:
         raw.plot(block=True, scalings="auto", picks=picks)
@@ -114,18 +178,19 @@ def main():
 
     print(f"Latest folder: {latest_folder}")
 
-    file_path = os.path.join(latest_folder, "eeg_data.csv")
+    file_path = find_data_file(latest_folder)
     response_path = os.path.join(latest_folder, "response_data.csv")
     sfreq = 250
 
-    raw, timestamps = create_raw_from_csv_pick(file_path, sfreq)
-    raw = filter_raw(raw)
+    # Filtered Raw and Epochs are read from ./.cache when nothing changed
+    cache = AnalysisCache()
+    raw, timestamps = load_filtered_raw(file_path, sfreq, cache)
 
     picks = ["Cz"]
 
     # plot_selected_channels(raw, picks=picks)
 
-    epochs = create_epochs(raw, response_path, timestamps, sfreq)
+    epochs = load_epochs(file_path, response_path, sfreq, cache)
 
     epochs.save("epoch.fif", overwrite=True)
 
@@ -3,21 +3,19 @@ import pandas as pd
 import numpy as np
 import mne
 
-def create_raw_from_csv_pick(file_path, sfreq):
-    data = pd.read_csv(file_path, header=None, sep=",")
-
-    print(f"Data shape before filtering: {data.shape}")
+import session_file
+from analysis_cache import AnalysisCache
+from session_file import find_data_file, load_channels
 
+def create_raw_from_csv_pick(file_path, sfreq):
     # Adjust these indices to match the columns of C4, Cz, C3 in your dataset
     # Assuming "N/A", "O2", "O1", "Pz", "C4", "Cz", "C3", "Fz" are in columns 0-7 respectively
     picks_columns = [0]  # Corresponding to "C4", "Cz", "C3"
-    data = data.iloc[:, picks_columns]
+    # BrainFlow returns data in microvolts, convert to volts for MNE
+    data = load_channels(file_path, picks_columns, sep=",", scale=1e-6)
 
     print(f"Data shape after filtering: {data.shape}")
 
-    data = data / 1e6  # BrainFlow returns data in microvolts, convert to volts for MNE
-    data = data.values.T
-
     ch_names = ["C3"]
     ch_types = ["eeg"] * len(ch_names)
 
@@ -31,13 +29,11 @@ def create_raw_from_csv_pick(file_path, sfreq):
     return raw
 
 def create_raw_from_csv(file_path, sfreq):
-    data = pd.read_csv(file_path, header=None, sep="\t")
+    # BrainFlow returns data in microvolts, convert to volts for MNE
+    data = load_channels(file_path, sep="\t", scale=1e-6)
 
     print(f"Data shape: {data.shape}")
 
-    data = data / 1e6  # BrainFlow returns data in microvolts, convert to volts for MNE
-    data = data.values.T
-
     ch_names = [
         "N/A",  # First channel is not connected
         "O2",
@@ -86,11 +82,16 @@ def main():
 
     print(f"Latest folder: {latest_folder}")
 
-    file_path = os.path.join(latest_folder, "eeg_data.csv")
+    file_path = find_data_file(latest_folder)
     sfreq = 250
 
-    raw = create_raw_from_csv_pick(file_path, sfreq)
-    raw = filter_raw(raw)
+    # Re-runs on the same recording read the filtered Raw from ./.cache
+    cache = AnalysisCache()
+    steps = [create_raw_from_csv_pick, filter_raw, session_file]
+    key = cache.key([file_path], steps, sfreq=sfreq)
+    raw = cache.get_or_compute(
+        key, lambda: {"raw": filter_raw(create_raw_from_csv_pick(file_path, sfreq))}
+    )["raw"]
 
     picks = ["C3"]
 
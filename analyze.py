@@ -3,18 +3,18 @@ import pandas as pd
 import numpy as np
 import mne
 
-def create_raw_from_csv_pick(file_path, sfreq):
-    data = pd.read_csv(file_path, header=None, sep="\t")
-
-    print(f"Data shape before filtering: {data.shape}")
+import session_file
+from analysis_cache import AnalysisCache
+from lazy_raw import read_raw_session
+from session_file import find_data_file, load_channels
 
-    picks_columns = [8]  # Corresponding to "Cz"
-    data = data.iloc[:, picks_columns]
+def create_raw_from_csv_pick(file_path, sfreq):
+    # Corresponding to "Cz"; binary sessions are picked by header name
+    picks_columns = ["channel_8"] if file_path.endswith(".bin") else [8]
+    # Only the picked columns are read, already in volts and (channels, times)
+    data = load_channels(file_path, picks_columns, sep="\t", scale=1e-6)
     print(f"Data shape after filtering: {data.shape}")
 
-    data = data / 1e6
-    data = data.values.T
-
     ch_names = ["Cz"]
     ch_types = ["eeg"] * len(ch_names)
 
@@ -28,13 +28,11 @@ def create_raw_from_csv_pick(file_path, sfreq):
     return raw
 
 def create_raw_from_csv(file_path, sfreq):
-    data = pd.read_csv(file_path, header=None, sep="\t")
+    # BrainFlow returns data in microvolts, convert to volts for MNE
+    data = load_channels(file_path, sep="\t", scale=1e-6)
 
     print(f"Data shape: {data.shape}")
 
-    data = data / 1e6  # BrainFlow returns data in microvolts, convert to volts for MNE
-    data = data.values.T
-
     ch_names = [
         "N/A",  # First channel is not connected
         "O2",
@@ -83,11 +81,29 @@ def main():
 
     print(f"Latest folder: {latest_folder}")
 
-    file_path = os.path.join(latest_folder, "eeg_data.csv")
+    file_path = find_data_file(latest_folder)
     sfreq = 250
 
-    raw = create_raw_from_csv_pick(file_path, sfreq)
-    raw = filter_raw(raw)
+    if file_path.endswith(".bin"):
+        # Binary sessions are read and filtered (same filters as filter_raw) only
+        # for the span being plotted, so long recordings need not fit in memory
+        raw = read_raw_session(
+            file_path,
+            columns=["channel_8"],  # Corresponding to "Cz"
+            ch_names=["Cz"],
+            l_freq=2.0,
+            h_freq=49.0,
+            notch_freqs=[50.0],
+        )
+    else:
+        # Re-runs on the same recording read the filtered Raw from ./.cache
+        cache = AnalysisCache()
+        steps = [create_raw_from_csv_pick, filter_raw, session_file]
+        key = cache.key([file_path], steps, sfreq=sfreq)
+        raw = cache.get_or_compute(
+            key,
+            lambda: {"raw": filter_raw(create_raw_from_csv_pick(file_path, sfreq))},
+        )["raw"]
 
     picks = ["Cz"]
 
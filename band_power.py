@@ -0,0 +1,105 @@
+import time
+import numpy as np
+
+from session_file import SessionWriter
+from spectral import SlidingSTFT
+
+# Same bands as DataFilter.get_avg_band_powers
+BANDS = {
+    "delta": (2.0, 4.0),
+    "theta": (4.0, 8.0),
+    "alpha": (8.0, 13.0),
+    "beta": (13.0, 30.0),
+    "gamma": (30.0, 45.0),
+}
+
+
+class BandPowerStage:
+    # Per-channel band powers every `hop` samples, from the Welch PSD of the
+    # last `window_size` samples. Band integration is one matrix product with
+    # precomputed band masks.
+    def __init__(
+        self,
+        num_channels,
+        sampling_rate,
+        window_size,
+        hop,
+        nperseg=None,
+        bands=BANDS,
+        relative=True,
+    ):
+        if nperseg is None:
+            nperseg = sampling_rate
+        self.num_channels = num_channels
+        self.sampling_rate = sampling_rate
+        self.band_names = list(bands)
+        self.relative = relative
+
+        # Segments start every `hop` samples, so each completed segment is a hop
+        self.stft = SlidingSTFT(
+            num_channels,
+            sampling_rate,
+            nperseg=nperseg,
+            step=hop,
+            num_average=(window_size - nperseg) // hop + 1,
+        )
+
+        freqs = self.stft.freqs
+        bin_width = freqs[1] - freqs[0]
+        self.band_masks = np.array(
+            [(freqs >= low) & (freqs < high) for low, high in bands.values()],
+            dtype=np.float64,
+        ).T * bin_width  # (num_bins, num_bands)
+
+        self.band_powers = np.zeros((num_channels, len(self.band_names)))
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        # callback(timestamp, band_powers) with band_powers (channels, bands)
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def update(self, new_samples):
+        # new_samples: filtered (num_channels, n). True when new powers were published
+        if self.stft.update(new_samples) == 0:
+            return False
+
+        psd, _ = self.stft.psd()
+        np.matmul(psd, self.band_masks, out=self.band_powers)
+        if self.relative:
+            total = self.band_powers.sum(axis=1, keepdims=True)
+            np.divide(self.band_powers, total, out=self.band_powers, where=total > 0)
+
+        timestamp = time.time()
+        for callback in self.subscribers:
+            callback(timestamp, self.band_powers)
+        return True
+
+    def average(self):
+        # Mean over channels, like the avg output of get_avg_band_powers
+        return self.band_powers.mean(axis=0)
+
+
+class BandPowerLog:
+    # Subscriber that appends (timestamp, channel x band) rows to a session file
+    def __init__(self, path, stage):
+        self.columns = ["timestamp"] + [
+            f"{band}_{channel + 1}"
+            for channel in range(stage.num_channels)
+            for band in stage.band_names
+        ]
+        self.writer = SessionWriter(
+            path, self.columns, stage.sampling_rate, timestamp_column=0
+        )
+        self.row = np.empty((len(self.columns), 1))
+        stage.subscribe(self)
+
+    def __call__(self, timestamp, band_powers):
+        self.row[0, 0] = timestamp
+        self.row[1:, 0] = band_powers.ravel()
+        self.writer.append(self.row)
+
+    def close(self):
+        self.writer.close()
@@ -0,0 +1,185 @@
+import argparse
+import os
+import logging
+import importlib
+
+import mne
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import ern
+from analysis_cache import CACHE_DIR, AnalysisCache
+from session_file import find_data_file
+
+# analyze-frn.py is not a valid module name for a plain import
+frn = importlib.import_module("analyze-frn")
+
+SFREQ = 250
+CONDITIONS = ("Correct", "Incorrect")
+
+
+def find_sessions(data_dir):
+    # Session folders with a recording and the task's response file
+    sessions = []
+    for folder in sorted(os.listdir(data_dir)):
+        session_dir = os.path.join(data_dir, folder)
+        if not os.path.isdir(session_dir):
+            continue
+        if not os.path.exists(find_data_file(session_dir)):
+            continue
+        if not os.path.exists(os.path.join(session_dir, "response_data.csv")):
+            continue
+        sessions.append(session_dir)
+    return sessions
+
+
+def evoked_path(output_dir, session_dir):
+    return os.path.join(output_dir, f"{os.path.basename(session_dir)}-ave.fif")
+
+
+def process_session(
+    session_dir, output_dir, ch_name="Cz", sfreq=SFREQ, cache_dir=CACHE_DIR
+):
+    # load -> filter_raw -> create_epochs -> calculate_ern, as in analyze-frn.py
+    # and ern.py, for one session. Runs in a worker process
+    mne.set_log_level("WARNING")
+
+    file_path = find_data_file(session_dir)
+    response_path = os.path.join(session_dir, "response_data.csv")
+
+    # Shares cache entries with analyze-frn.py
+    cache = AnalysisCache(cache_dir)
+    epochs = frn.load_epochs(file_path, response_path, sfreq, cache)
+    epochs = ern.preprocess_epochs(epochs)
+
+    evoked_resp_cor, evoked_resp_wro = ern.calculate_ern(epochs, ch_name)
+    evoked_resp_cor.comment = "Correct"
+    evoked_resp_wro.comment = "Incorrect"
+
+    path = evoked_path(output_dir, session_dir)
+    mne.write_evokeds(path, [evoked_resp_cor, evoked_resp_wro], overwrite=True)
+    return path, evoked_resp_cor.nave, evoked_resp_wro.nave
+
+
+def grand_average(paths, output_dir):
+    # Equal-weight average over sessions for each condition
+    evokeds = {condition: [] for condition in CONDITIONS}
+    for path in paths:
+        for condition in CONDITIONS:
+            evokeds[condition].append(
+                mne.read_evokeds(path, condition=condition, verbose=False)
+            )
+
+    grand_averages = []
+    for condition in CONDITIONS:
+        average = mne.grand_average(evokeds[condition])
+        average.comment = condition
+        grand_averages.append(average)
+
+    path = os.path.join(output_dir, "grand-ave.fif")
+    mne.write_evokeds(path, grand_averages, overwrite=True)
+    return path
+
+
+def batch_ern(
+    data_dir,
+    output_dir,
+    workers=None,
+    ch_name="Cz",
+    sfreq=SFREQ,
+    overwrite=False,
+    cache_dir=CACHE_DIR,
+):
+    os.makedirs(output_dir, exist_ok=True)
+    sessions = find_sessions(data_dir)
+
+    paths = []
+    pending = []
+    for session_dir in sessions:
+        path = evoked_path(output_dir, session_dir)
+        if not overwrite and os.path.exists(path):
+            paths.append(path)
+        else:
+            pending.append(session_dir)
+    print(
+        f"{len(sessions)} sessions in {data_dir}, "
+        f"{len(pending)} to process, {len(paths)} already done"
+    )
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                process_session, session_dir, output_dir, ch_name, sfreq, cache_dir
+            ): session_dir
+            for session_dir in pending
+        }
+        for future in as_completed(futures):
+            try:
+                path, num_correct, num_incorrect = future.result()
+                print(
+                    f"{futures[future]}: {num_correct} correct / "
+                    f"{num_incorrect} incorrect epochs"
+                )
+                paths.append(path)
+            except Exception:
+                logging.warning(f"{futures[future]} failed", exc_info=True)
+
+    if not paths:
+        return None
+    path = grand_average(sorted(paths), output_dir)
+    print(f"Grand average of {len(paths)} sessions written to {path}")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--data-dir",
+        type=str,
+        help="directory with one folder per session",
+        required=False,
+        default="./data",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        help="directory for the per-session and grand average evokeds",
+        required=False,
+        default="./ern",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="number of processes, defaults to the number of cores",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--channel", type=str, help="channel to average", required=False, default="Cz"
+    )
+    parser.add_argument(
+        "--sfreq", type=int, help="sampling rate", required=False, default=SFREQ
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="cache for filtered Raw and Epochs",
+        required=False,
+        default=CACHE_DIR,
+    )
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    batch_ern(
+        args.data_dir,
+        args.output_dir,
+        workers=args.workers,
+        ch_name=args.channel,
+        sfreq=args.sfreq,
+        overwrite=args.overwrite,
+        cache_dir=args.cache_dir,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import itertools
+import os
+import logging
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from session_file import SessionWriter, default_column_names
+
+SFREQ = 250
+
+
+def detect_layout(file_path, num_lines=5):
+    # The recorders have written three layouts over time:
+    #   task_record.py        tab separated, EEG channels only
+    #   task_record_fixed.py  tab separated, board timestamp + EEG channels
+    #   motor_imagery.py      comma separated, EEG channels + timestamp + label
+    with open(file_path, "r") as file:
+        lines = [file.readline() for _ in range(num_lines)]
+    lines = [line.strip() for line in lines if line.strip()]
+    if not lines:
+        return None
+
+    sep = "\t" if "\t" in lines[0] else ","
+
+    header = None
+    fields = lines[0].split(sep)
+    try:
+        [float(value) for value in fields]
+    except ValueError:
+        header = [value.strip() for value in fields]
+        lines = lines[1:]
+        if not lines:
+            return None
+
+    first_row = [float(value) for value in lines[0].split(sep)]
+    num_columns = len(first_row)
+
+    timestamp_column = None
+    label_column = None
+    if header is not None:
+        columns = header
+        if "timestamp" in columns:
+            timestamp_column = columns.index("timestamp")
+        if "label" in columns:
+            label_column = columns.index("label")
+    elif sep == ",":
+        columns = default_column_names(num_columns - 2) + ["timestamp", "label"]
+        timestamp_column = num_columns - 2
+        label_column = num_columns - 1
+    elif first_row[0] > 1e9:  # unix time from the board timestamp channel
+        columns = default_column_names(num_columns - 1, timestamp=True)
+        timestamp_column = 0
+    else:
+        columns = default_column_names(num_columns)
+
+    return {
+        "sep": sep,
+        "header": header is not None,
+        "columns": columns,
+        "timestamp_column": timestamp_column,
+        "label_column": label_column,
+    }
+
+
+def infer_sfreq(timestamps):
+    # Average rate over the span rather than per-sample diffs: the board
+    # timestamps arrive in packets, so neighbouring samples can share a stamp
+    timestamps = timestamps[np.isfinite(timestamps)]
+    if len(timestamps) < 2 or timestamps[-1] <= timestamps[0]:
+        return None
+    return round((len(timestamps) - 1) / (timestamps[-1] - timestamps[0]))
+
+
+def convert_file(file_path, output_path=None, sfreq=None, chunk_rows=50000):
+    # sfreq=None infers the rate from the timestamp column, or falls back to SFREQ
+    if output_path is None:
+        output_path = os.path.splitext(file_path)[0] + ".bin"
+
+    layout = detect_layout(file_path)
+    if layout is None:
+        logging.warning(f"{file_path} is empty, skipped")
+        return file_path, 0
+
+    num_samples = 0
+    reader = pd.read_csv(
+        file_path,
+        sep=layout["sep"],
+        header=0 if layout["header"] else None,
+        dtype=np.float64,
+        chunksize=chunk_rows,
+    )
+    first_chunk = next(reader, None)
+    if first_chunk is None:
+        logging.warning(f"{file_path} has no samples, skipped")
+        return file_path, 0
+    if sfreq is None and layout["timestamp_column"] is not None:
+        sfreq = infer_sfreq(first_chunk.values[:, layout["timestamp_column"]])
+        if sfreq is None:
+            logging.warning(f"{file_path}: could not infer sfreq from timestamps")
+    if sfreq is None:
+        sfreq = SFREQ
+
+    # Write to a temporary file so an interrupted run never leaves a
+    # truncated session that find_data_file would prefer over the CSV
+    temp_path = output_path + ".tmp"
+    with SessionWriter(
+        temp_path,
+        layout["columns"],
+        sfreq,
+        timestamp_column=layout["timestamp_column"],
+        label_column=layout["label_column"],
+    ) as session:
+        for chunk in itertools.chain([first_chunk], reader):
+            session.append(chunk.values.T)
+            num_samples += len(chunk)
+    os.replace(temp_path, output_path)
+
+    return file_path, num_samples
+
+
+def find_sessions(data_dir, name="eeg_data", overwrite=False):
+    sessions = []
+    for folder in sorted(os.listdir(data_dir)):
+        csv_path = os.path.join(data_dir, folder, f"{name}.csv")
+        bin_path = os.path.join(data_dir, folder, f"{name}.bin")
+        if not os.path.exists(csv_path):
+            continue
+        if (
+            not overwrite
+            and os.path.exists(bin_path)
+            and os.path.getmtime(bin_path) >= os.path.getmtime(csv_path)
+        ):
+            continue
+        sessions.append(csv_path)
+    return sessions
+
+
+def convert_sessions(
+    data_dir, workers=None, overwrite=False, sfreq=None, chunk_rows=50000
+):
+    sessions = find_sessions(data_dir, overwrite=overwrite)
+    print(f"Converting {len(sessions)} sessions in {data_dir}")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(convert_file, path, sfreq=sfreq, chunk_rows=chunk_rows)
+            for path in sessions
+        ]
+        for future in as_completed(futures):
+            try:
+                file_path, num_samples = future.result()
+                print(f"{file_path}: {num_samples} samples")
+            except Exception:
+                logging.warning("Exception", exc_info=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--data-dir",
+        type=str,
+        help="directory with one folder per session",
+        required=False,
+        default="./data",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="number of processes, defaults to the number of cores",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        help="rows parsed per chunk",
+        required=False,
+        default=50000,
+    )
+    parser.add_argument(
+        "--sfreq",
+        type=float,
+        help=f"sampling rate, inferred from the timestamps or {SFREQ} if not given",
+        required=False,
+        default=None,
+    )
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    convert_sessions(
+        args.data_dir,
+        workers=args.workers,
+        overwrite=args.overwrite,
+        sfreq=args.sfreq,
+        chunk_rows=args.chunk_rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
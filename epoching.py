@@ -1,44 +1,95 @@
-import pandas as pd
 import numpy as np
+import mne
 from typing import List, Dict
 
-def create_epochs(data) -> List[Dict]:
-    epochs = []
-    current_epoch = []
-    current_label = None
+from session_file import read_session
 
-    for _, row in data.iterrows():
-        label = row["label"]
 
-        if current_label is None:
-            current_label = label
+def find_label_boundaries(labels):
+    # Start/stop sample of every run of identical labels
+    labels = np.asarray(labels)
+    changes = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+    starts = np.concatenate(([0], changes))
+    stops = np.concatenate((changes, [len(labels)]))
+    return starts, stops
 
-        if label != current_label:
-            epoch = {
-                "eeg_data": np.array(current_epoch),
-                "label": current_label,
-            }
-            epochs.append(epoch)
-            current_epoch = []
-            current_label = label
 
-        current_epoch.append(row["channel_1"])
+def create_epochs(data, labels) -> List[Dict]:
+    # data: (n_channels, n_samples). eeg_data of every epoch is a view into data
+    labels = np.asarray(labels)
+    if len(labels) == 0:
+        return []
 
+    starts, stops = find_label_boundaries(labels)
 
-    if len(current_epoch) > 0:
+    epochs = []
+    for start, stop in zip(starts, stops):
         epoch = {
-            "eeg_data": np.array(current_epoch),
-            "label": current_label,
+            "eeg_data": data[:, start:stop],
+            "label": labels[start],
         }
         epochs.append(epoch)
 
     return epochs
 
 
-data = pd.read_csv("eeg_data.csv")
+def create_padded_epochs(data, labels, fill_value=0.0):
+    # (n_epochs, n_channels, max_length) array plus the length of every epoch
+    labels = np.asarray(labels)
+    starts, stops = find_label_boundaries(labels)
+    lengths = stops - starts
+
+    # Epochs cover the recording back to back, so the valid cells of the padded
+    # array in row-major order are exactly the samples in recording order
+    padded = np.full(
+        (len(lengths), lengths.max(), data.shape[0]), fill_value, dtype=np.float64
+    )
+    mask = np.arange(lengths.max())[np.newaxis, :] < lengths[:, np.newaxis]
+    padded[mask] = data.T
+
+    return padded.transpose(0, 2, 1), lengths, labels[starts]
+
+
+def create_epochs_array(data, labels, sfreq, ch_names, length=None, scale=None):
+    # Equal-length epochs from the start of every label run, for mne.EpochsArray.
+    # Runs shorter than `length` (default: the shortest run) are dropped.
+    # scale multiplies the data, e.g. 1e-6 for BrainFlow microvolts to volts
+    labels = np.asarray(labels).astype(np.int64)
+    starts, stops = find_label_boundaries(labels)
+    lengths = stops - starts
+
+    if length is None:
+        length = lengths.min()
+    keep = lengths >= length
+    starts = starts[keep]
+
+    indices = starts[:, np.newaxis] + np.arange(length)[np.newaxis, :]
+    epochs_data = data[:, indices].transpose(1, 0, 2)
+    if scale is not None:
+        epochs_data *= scale  # fancy indexing above made a copy
+
+    events = np.column_stack(
+        (starts, np.zeros(len(starts), dtype=np.int64), labels[starts])
+    )
+    event_id = {str(label): int(label) for label in np.unique(labels[starts])}
+
+    info = mne.create_info(ch_names=ch_names, sfreq=sfreq, ch_types="eeg")
+    return mne.EpochsArray(epochs_data, info, events=events, event_id=event_id)
+
+
+def main():
+    session = read_session("eeg_data.bin")
+
+    # Channel columns come first, so this is a view into the memory map
+    num_channels = sum(column.startswith("channel_") for column in session.columns)
+    data = session.data[:, :num_channels].T
+    labels = session.labels
+
+    epochs = create_epochs(data, labels)
 
-epochs = create_epochs(data)
+    for epoch in epochs:
+        print(epoch["eeg_data"].shape, epoch["label"])
 
-for epoch in epochs:
-    print(epoch["eeg_data"].shape, epoch["label"])
 
+if __name__ == "__main__":
+    main()
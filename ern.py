@@ -1,30 +1,31 @@
 import mne
 import numpy as np
 import matplotlib.pyplot as plt
-from autoreject import AutoReject
+
+import evoked_stats
 
 
 def load_and_preprocess_data(filename):
     # データのロード
     epochs = mne.read_epochs(filename, preload=True)
 
-    epochs.filter(l_freq=None, h_freq=30)
+    return preprocess_epochs(epochs)
 
-    return epochs
 
+def preprocess_epochs(epochs):
+    epochs.filter(l_freq=None, h_freq=30)
 
-def calculate_ern(epochs, ch_name):
-    # 正解と誤答のEpochsを分ける
-    epochs_resp_cor = epochs["Correct"]
-    epochs_resp_wro = epochs["Incorrect"]
+    return epochs
 
-    # チャンネル名を指定
-    epochs_resp_cor.pick([ch_name])
-    epochs_resp_wro.pick([ch_name])
 
-    # 平均を取得
-    evoked_resp_cor = epochs_resp_cor.average()
-    evoked_resp_wro = epochs_resp_wro.average()
+def calculate_ern(epochs, ch_name=None):
+    # 正解と誤答の平均を取得 (ch_name=None なら全チャンネル)
+    # Epochs are split by event code from one get_data call, not copied per condition
+    picks = None if ch_name is None else [ch_name]
+    data, info = evoked_stats.condition_data(epochs, picks=picks)
+    evokeds = evoked_stats.evoked_arrays(data, info, epochs.tmin)
+    evoked_resp_cor = evokeds["Correct"]
+    evoked_resp_wro = evokeds["Incorrect"]
 
     print(f"Evoke Correct Response: {evoked_resp_cor.data}")
     print(f"Evoke Incorrect Response: {evoked_resp_wro.data}")
@@ -43,7 +44,7 @@ def calculate_ern(epochs, ch_name):
     return evoked_resp_cor, evoked_resp_wro
 
 
-def plot_ern(evoked_resp_cor, evoked_resp_wro, ch_name, large_scale=False):
+def plot_ern(evoked_resp_cor, evoked_resp_wro, ch_name, large_scale=False, ci=None):
     # チャンネルを選択
     ch_index = evoked_resp_wro.ch_names.index(ch_name)
     time_ms = evoked_resp_wro.times * 1000
@@ -59,6 +60,12 @@ def plot_ern(evoked_resp_cor, evoked_resp_wro, ch_name, large_scale=False):
         time_ms, evoked_resp_wro.data[ch_index], label="Incorrect Response", color="red"
     )
 
+    # evoked_stats.bootstrap_ci の信頼区間 (チャンネルの並びはEvokedと同じ)
+    if ci is not None:
+        for condition, color in (("Correct", "blue"), ("Incorrect", "red")):
+            lower, upper = ci[condition][:, ch_index]
+            ax.fill_between(time_ms, lower, upper, color=color, alpha=0.2)
+
     # プロットの設定
     ax.set_title(f"FRN at {ch_name}")
     ax.set_xlabel("Time (ms)")
@@ -99,6 +106,8 @@ def plot_ern(evoked_resp_cor, evoked_resp_wro, ch_name, large_scale=False):
 def autoreject_epochs(epochs):
     # Autorejectを使ってEpochsをリジェクトする
     # 注意: チャネル数が少ない時は使えない
+    from autoreject import AutoReject  # requirements.txt に含まれていないので必要な時だけ
+
     ar = AutoReject(verbose=True)
     epochs_clean = ar.fit_transform(epochs)
 
@@ -107,7 +116,6 @@ def autoreject_epochs(epochs):
 def ica_preprocessing(epochs):
     # ICAを使ってアーティファクトを除去する
     # 注意: チャネル数が少ない時
-    ar = AutoReject(verbose=True)
     ica = mne.preprocessing.ICA(n_components=1)
     ica.fit(epochs)
 
@@ -132,5 +140,10 @@ if __name__ == "__main__":
 
     print("Epochs Info:", epochs.info)
 
-    evoked_resp_cor, evoked_resp_wro = calculate_ern(epochs, "Cz")
-    plot_ern(evoked_resp_cor, evoked_resp_wro, "Cz", large_scale=False)
+    evoked_resp_cor, evoked_resp_wro = calculate_ern(epochs)
+
+    # 全チャンネルのブートストラップ信頼区間
+    data, _ = evoked_stats.condition_data(epochs)
+    ci = evoked_stats.bootstrap_ci(data, workers=4)["ci"]
+
+    plot_ern(evoked_resp_cor, evoked_resp_wro, "Cz", large_scale=False, ci=ci)
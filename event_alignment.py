@@ -0,0 +1,92 @@
+import logging
+import numpy as np
+
+# Values written to the BrainFlow marker channel by the task scripts
+MARKER_CUE = 1.0
+MARKER_CORRECT = 2.0
+MARKER_INCORRECT = 3.0
+
+
+def align_events(
+    timestamps, event_times, event_ids, sfreq, clock_offset=0.0, max_gap=None
+):
+    # Map event times (time.time() in the task process) to the nearest sample of
+    # the board timestamp channel in one searchsorted pass and return an MNE
+    # events array (sample, 0, id).
+    #   clock_offset  added to event_times to move them onto the board clock
+    #   max_gap       events inside a gap between samples wider than this
+    #                 (dropped packets) are discarded, as are events outside
+    #                 the recording. Defaults to 4x the typical spacing
+    # The board stamps samples per packet, so neighbouring samples can share a
+    # timestamp; the typical spacing is the median step between distinct
+    # stamps, not 1 / sfreq
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    event_times = np.asarray(event_times, dtype=np.float64) + clock_offset
+    event_ids = np.asarray(event_ids, dtype=np.int64)
+
+    if len(timestamps) < 2 or len(event_times) == 0:
+        return np.empty((0, 3), dtype=np.int64)
+
+    if np.any(np.diff(timestamps) < 0):
+        raise ValueError("Board timestamps must be monotonically increasing")
+
+    # Relative times cannot be placed on the board clock by guessing where they
+    # start (the task clock starts before the board has finished streaming up)
+    if event_times.max() < 1e9 <= timestamps[0]:
+        raise ValueError(
+            "Event times look relative, not unix time; pass clock_offset "
+            "(the time.time() they are counted from) to align them"
+        )
+
+    steps = np.diff(timestamps)
+    steps = steps[steps > 0]
+    spacing = np.median(steps) if len(steps) else 1.0 / sfreq
+    if max_gap is None:
+        max_gap = 4 * spacing
+
+    right = np.clip(np.searchsorted(timestamps, event_times), 1, len(timestamps) - 1)
+    left = right - 1
+    use_left = (event_times - timestamps[left]) <= (timestamps[right] - event_times)
+    sample_indices = np.where(use_left, left, right)
+
+    # Near a sample, or inside the recording between two samples that are
+    # not separated by a gap
+    distance = np.abs(timestamps[sample_indices] - event_times)
+    inside = (event_times >= timestamps[0]) & (event_times <= timestamps[-1])
+    gap = timestamps[right] - timestamps[left]
+    valid = (distance <= spacing) | (inside & (gap <= max_gap))
+    if not np.all(valid):
+        logging.warning(
+            f"{np.count_nonzero(~valid)} events fall outside the recording "
+            "or into a gap in the data and were dropped"
+        )
+
+    events = np.column_stack(
+        (
+            sample_indices[valid],
+            np.zeros(np.count_nonzero(valid), dtype=np.int64),
+            event_ids[valid],
+        )
+    )
+    return events[np.argsort(events[:, 0], kind="stable")]
+
+
+def events_from_markers(markers, marker_ids):
+    # MNE events array from the board marker channel. marker_ids maps marker
+    # values to event ids; other markers are ignored
+    markers = np.asarray(markers)
+    sample_indices = np.flatnonzero(markers)
+    values = markers[sample_indices]
+
+    event_ids = np.full(len(values), -1, dtype=np.int64)
+    for marker, event_id in marker_ids.items():
+        event_ids[values == marker] = event_id
+
+    keep = event_ids >= 0
+    return np.column_stack(
+        (
+            sample_indices[keep],
+            np.zeros(np.count_nonzero(keep), dtype=np.int64),
+            event_ids[keep],
+        )
+    )
@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import mne
+
+CONDITIONS = ("Correct", "Incorrect")
+
+# Condition averages and their uncertainty for every channel and time point at
+# once. Epochs are split by event code from a single get_data() call, and every
+# resample is a row of a weight matrix, so a whole batch of bootstrap /
+# permutation means is one matrix product per block of (channel, time) columns:
+#   (block_size, num_epochs) @ (num_epochs, num_resamples)
+# Resamples are the contiguous axis, which makes the percentile partitions
+# (most of the time) about twice as fast as partitioning along columns.
+# Blocks are independent, so they can run on a thread pool (NumPy releases the
+# GIL in the matmul and the partitions).
+
+
+def _pick_indices(info, picks):
+    if picks is None:
+        return mne.pick_types(info, eeg=True, exclude="bads")
+    return mne.pick_channels(info["ch_names"], include=list(picks), ordered=True)
+
+
+def condition_data(epochs, conditions=CONDITIONS, picks=None):
+    # {condition: (num_epochs, num_channels, num_times)}, plus the picked info
+    indices = _pick_indices(epochs.info, picks)
+    data = epochs.get_data(picks=indices)
+    codes = epochs.events[:, 2]
+    by_condition = {
+        condition: data[codes == epochs.event_id[condition]]
+        for condition in conditions
+    }
+    return by_condition, mne.pick_info(epochs.info, indices)
+
+
+def condition_means(data):
+    return {condition: values.mean(axis=0) for condition, values in data.items()}
+
+
+def bootstrap_weights(rng, num_resamples, num_epochs):
+    # Row i averages the epochs drawn (with replacement) in resample i
+    draws = rng.integers(0, num_epochs, size=(num_resamples, num_epochs))
+    draws += np.arange(num_resamples)[:, None] * num_epochs
+    counts = np.bincount(draws.ravel(), minlength=num_resamples * num_epochs)
+    return counts.reshape(num_resamples, num_epochs) / num_epochs
+
+
+def permutation_weights(rng, num_permutations, num_first, num_second):
+    # Row i gives mean(second) - mean(first) under a random relabelling of the
+    # pooled epochs
+    num_epochs = num_first + num_second
+    order = np.tile(np.arange(num_epochs), (num_permutations, 1))
+    second = rng.permuted(order, axis=1) < num_second
+    return np.where(second, 1.0 / num_second, -1.0 / num_first)
+
+
+def _map_blocks(compute, num_features, block_size, workers):
+    blocks = [
+        slice(start, min(start + block_size, num_features))
+        for start in range(0, num_features, block_size)
+    ]
+    if workers is None or workers <= 1:
+        return [compute(block) for block in blocks]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(compute, blocks))
+
+
+def bootstrap_ci(
+    data, num_resamples=10000, ci=0.95, block_size=512, workers=None, seed=None
+):
+    # Percentile bootstrap of each condition mean and of the difference
+    # (last condition - first, i.e. Incorrect - Correct). Epochs are resampled
+    # within each condition; the same resamples are used for every column.
+    # Returns {"mean": {condition: (ch, t)}, "difference": (ch, t),
+    #          "ci": {condition / "difference": (2, ch, t) lower, upper}}
+    rng = np.random.default_rng(seed)
+    conditions = list(data)
+    first, last = conditions[0], conditions[-1]
+    shape = data[first].shape[1:]
+    # (channel * time, epochs) and (epochs, resamples)
+    flat = {c: values.reshape(len(values), -1).T for c, values in data.items()}
+    weights = {
+        c: bootstrap_weights(rng, num_resamples, len(values)).T
+        for c, values in data.items()
+    }
+    percentiles = [50 * (1 - ci), 50 * (1 + ci)]
+
+    def compute(block):
+        means = {c: flat[c][block] @ weights[c] for c in conditions}
+        means["difference"] = means[last] - means[first]
+        # The means are scratch, so the percentiles may partition them in place
+        return {
+            name: np.percentile(values, percentiles, axis=1, overwrite_input=True)
+            for name, values in means.items()
+        }
+
+    results = _map_blocks(compute, flat[first].shape[0], block_size, workers)
+    ci = {}
+    for name in conditions + ["difference"]:
+        bounds = np.concatenate([result[name] for result in results], axis=1)
+        ci[name] = bounds.reshape((2,) + shape)
+
+    means = condition_means(data)
+    return {"mean": means, "difference": means[last] - means[first], "ci": ci}
+
+
+def permutation_test(
+    data, num_permutations=10000, ci=0.95, block_size=512, workers=None, seed=None
+):
+    # Pointwise two-sided permutation test of the difference (last condition -
+    # first) against exchangeable condition labels.
+    # Returns {"difference": (ch, t), "p_values": (ch, t),
+    #          "null_ci": (2, ch, t) band of the difference under H0}
+    rng = np.random.default_rng(seed)
+    conditions = list(data)
+    first, last = data[conditions[0]], data[conditions[-1]]
+    shape = first.shape[1:]
+    pooled = np.concatenate([first, last]).reshape(len(first) + len(last), -1).T
+    weights = permutation_weights(rng, num_permutations, len(first), len(last)).T
+    difference = (last.mean(axis=0) - first.mean(axis=0)).reshape(-1)
+    percentiles = [50 * (1 - ci), 50 * (1 + ci)]
+
+    def compute(block):
+        null = pooled[block] @ weights
+        exceed = (np.abs(null) >= np.abs(difference[block, None])).sum(axis=1)
+        p_values = (exceed + 1) / (num_permutations + 1)
+        return p_values, np.percentile(null, percentiles, axis=1, overwrite_input=True)
+
+    results = _map_blocks(compute, pooled.shape[0], block_size, workers)
+    p_values = np.concatenate([result[0] for result in results])
+    null_ci = np.concatenate([result[1] for result in results], axis=1)
+    return {
+        "difference": difference.reshape(shape),
+        "p_values": p_values.reshape(shape),
+        "null_ci": null_ci.reshape((2,) + shape),
+    }
+
+
+def evoked_arrays(data, info, tmin):
+    # {condition: mne.EvokedArray}, what Epochs.average() gives per condition
+    return {
+        condition: mne.EvokedArray(
+            values.mean(axis=0), info, tmin=tmin, nave=len(values), comment=condition
+        )
+        for condition, values in data.items()
+    }
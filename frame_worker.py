@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+
+from latency import LatencyMonitor
+
+
+class FrameWorker:
+    # Calls process() every `interval` seconds on a background thread and keeps
+    # only the latest frame it returns. The GUI takes that frame at its own rate;
+    # a frame replaced before it was taken is counted as dropped.
+    # Processing time and frame latency also go to `monitor`, which is dumped
+    # periodically from the worker thread.
+    def __init__(self, process, interval, alpha=0.1, monitor=None):
+        self.process = process
+        self.interval = interval
+        self.alpha = alpha
+        self.monitor = monitor or LatencyMonitor(enabled=False)
+
+        self.lock = threading.Lock()
+        self.frame = None
+        self.created = None
+        self.num_produced = 0
+        self.num_dropped = 0
+        self.num_overruns = 0
+        self.process_ms = None  # time spent in process()
+        self.latency_ms = None  # frame finished -> taken by the GUI
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def _smooth(self, average, value):
+        if average is None:
+            return value
+        return average + self.alpha * (value - average)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.monitor.dump()
+
+    def run(self):
+        next_time = time.monotonic()
+        while not self.stop_event.wait(max(0.0, next_time - time.monotonic())):
+            start = time.monotonic()
+            try:
+                frame = self.process()
+            except Exception:
+                logging.exception("Frame processing failed, stopping worker")
+                break
+            end = time.monotonic()
+            self.monitor.record("process", (end - start) * 1000)
+            self.monitor.maybe_dump()
+
+            with self.lock:
+                self.process_ms = self._smooth(self.process_ms, (end - start) * 1000)
+                if frame is not None:
+                    if self.frame is not None:
+                        self.num_dropped += 1
+                    self.frame = frame
+                    self.created = end
+                    self.num_produced += 1
+
+            next_time += self.interval
+            if next_time < end:
+                # Overran: skip the missed ticks instead of running them back to back
+                self.num_overruns += 1
+                next_time = end
+
+    def take(self):
+        # Latest complete frame, or None if nothing new since the last call
+        with self.lock:
+            frame = self.frame
+            if frame is not None:
+                self.frame = None
+                latency_ms = (time.monotonic() - self.created) * 1000
+                self.latency_ms = self._smooth(self.latency_ms, latency_ms)
+        if frame is not None:
+            self.monitor.record("frame_latency", latency_ms)
+        return frame
+
+    def format(self):
+        if self.process_ms is None or self.latency_ms is None:
+            return ""
+        text = (
+            f"proc {self.process_ms:.1f} ms | latency {self.latency_ms:.1f} ms"
+            f" | dropped {self.num_dropped}/{self.num_produced}"
+        )
+        details = self.monitor.format()
+        if details:
+            text += "\n" + details
+        return text
@@ -0,0 +1,151 @@
+import os
+import csv
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    # Reused for every chunk, so timing a stage allocates nothing
+    def __init__(self, samples):
+        self.samples = samples
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append((time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class LatencyMonitor:
+    # Durations (ms) of the pipeline stages and queue depths, kept for the last
+    # `window` chunks. Percentiles are only computed when summary() is called
+    # (overlay refresh, dumps), recording is a deque append. With enabled=False
+    # stage() returns a shared no-op context and record/gauge return at once.
+    #   with monitor.stage("filter"): ...
+    #   monitor.record("end_to_end", (time.time() - board_timestamp) * 1000)
+    #   monitor.gauge("chunk", num_new_samples)
+    def __init__(self, enabled=True, window=2048, dump_path=None, dump_interval=10.0):
+        self.enabled = enabled
+        self.window = window
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.last_dump = time.monotonic()
+
+        self.stages = {}
+        self.timers = {}
+        self.gauges = {}
+        self.counts = {}
+
+    def _series(self, series, name):
+        samples = series.get(name)
+        if samples is None:
+            samples = series[name] = deque(maxlen=self.window)
+        return samples
+
+    def stage(self, name):
+        if not self.enabled:
+            return NULL_STAGE
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = _Stage(self._series(self.stages, name))
+        return timer
+
+    def record(self, name, milliseconds):
+        if not self.enabled:
+            return
+        self._series(self.stages, name).append(milliseconds)
+
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        self._series(self.gauges, name).append(value)
+
+    def summary(self):
+        # list() copies a deque without releasing the GIL, so this is safe while
+        # other threads keep recording
+        result = {"time": time.time(), "stages": {}, "gauges": {}}
+        for name, samples in list(self.stages.items()):
+            values = np.array(list(samples))
+            if len(values) == 0:
+                continue
+            stats = {"count": len(values), "mean": float(values.mean())}
+            for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                stats[f"p{q}"] = float(value)
+            stats["max"] = float(values.max())
+            result["stages"][name] = stats
+        for name, samples in list(self.gauges.items()):
+            values = np.array(list(samples))
+            if len(values) == 0:
+                continue
+            result["gauges"][name] = {
+                "last": float(values[-1]),
+                "mean": float(values.mean()),
+                "max": float(values.max()),
+            }
+        return result
+
+    def format(self):
+        if not self.enabled:
+            return ""
+        summary = self.summary()
+        lines = [
+            f"{name} p50 {s['p50']:.1f} p95 {s['p95']:.1f} p99 {s['p99']:.1f} ms"
+            for name, s in summary["stages"].items()
+        ]
+        lines += [
+            f"{name} {g['last']:.0f} (max {g['max']:.0f})"
+            for name, g in summary["gauges"].items()
+        ]
+        return "\n".join(lines)
+
+    def dump(self, path=None):
+        # .json: the latest summary. .csv: one row per stage / gauge, appended
+        # on every dump so the file is a time series of the session
+        path = path or self.dump_path
+        if not self.enabled or path is None:
+            return
+        summary = self.summary()
+
+        if path.endswith(".json"):
+            with open(path, "w") as file:
+                json.dump(summary, file, indent=2)
+            return
+
+        fields = ["time", "kind", "name", "count", "mean", "last"]
+        fields += [f"p{q}" for q in PERCENTILES] + ["max"]
+        write_header = not os.path.exists(path)
+        with open(path, "a", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            if write_header:
+                writer.writeheader()
+            for kind in ("stages", "gauges"):
+                for name, stats in summary[kind].items():
+                    row = {"time": summary["time"], "kind": kind[:-1], "name": name}
+                    writer.writerow({**row, **stats})
+
+    def maybe_dump(self):
+        if not self.enabled or self.dump_path is None:
+            return
+        now = time.monotonic()
+        if now - self.last_dump >= self.dump_interval:
+            self.last_dump = now
+            self.dump()
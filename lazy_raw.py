@@ -0,0 +1,176 @@
+import numpy as np
+import mne
+from scipy import signal
+
+from session_file import read_session
+
+# MNE Raw backed by a binary session file (session_file.py). Nothing is loaded
+# up front: every read (raw.plot scrolling, Epochs, get_data) takes only the
+# requested span from the memmap and filters it on the way out, so multi-hour
+# recordings work with memory bounded by the span being looked at.
+#
+#   raw = read_raw_session("data/xxx/eeg_data.bin", l_freq=2.0, h_freq=49.0,
+#                          notch_freqs=[50.0])
+#   raw.plot(block=True, scalings="auto")
+#
+# Filtering is overlap-save: each span is extended by the filters' length (FIR
+# taps / IIR ringing) on both sides, filtered with the same
+# mne.filter functions raw.filter / raw.notch_filter use, and the padding is
+# discarded. Inside the recording the result matches filtering the preloaded
+# Raw; at the file edges MNE's own edge padding applies as before.
+
+
+def _filter_length(sfreq, l_freq, h_freq, method, **kwargs):
+    filt = mne.filter.create_filter(
+        None, sfreq, l_freq, h_freq, method=method, verbose=False, **kwargs
+    )
+    if method == "iir":
+        # The ringing estimate is where the response has decayed, not where it
+        # is gone, and filtfilt runs it twice. 4x matches preloaded filtering to
+        # ~1e-10 of the signal range
+        return 4 * filt["padlen"]
+    return len(filt)
+
+
+def _notch_length(sfreq, freq, method, trans_bandwidth=1.0):
+    # Band-stop as mne.filter.notch_filter designs it with the default notch
+    # width (freq / 200)
+    tb_2 = trans_bandwidth / 2.0
+    l_freq = freq + freq / 400.0 + tb_2
+    h_freq = freq - freq / 400.0 - tb_2
+    return _filter_length(
+        sfreq, l_freq, h_freq, method, l_trans_bandwidth=tb_2, h_trans_bandwidth=tb_2
+    )
+
+
+class RawSession(mne.io.BaseRaw):
+    def __init__(
+        self,
+        path,
+        columns=None,
+        ch_names=None,
+        scale=1e-6,
+        l_freq=None,
+        h_freq=None,
+        notch_freqs=None,
+        method="iir",
+        verbose=None,
+    ):
+        session = read_session(path)
+        if columns is None:
+            # Every column except timestamps, labels and markers
+            skip = {
+                session.timestamp_column,
+                session.label_column,
+                session.marker_column,
+            }
+            columns = [i for i in range(len(session.columns)) if i not in skip]
+        columns = [
+            session.columns.index(column) if isinstance(column, str) else column
+            for column in columns
+        ]
+        if ch_names is None:
+            ch_names = [session.columns[column] for column in columns]
+        sfreq = session.sampling_rate
+
+        pad = 0
+        if l_freq is not None or h_freq is not None:
+            pad += _filter_length(sfreq, l_freq, h_freq, method)
+        for freq in notch_freqs or []:
+            pad += _notch_length(sfreq, freq, method)
+
+        info = mne.create_info(ch_names=list(ch_names), sfreq=sfreq, ch_types="eeg")
+        with info._unlock():
+            if l_freq is not None:
+                info["highpass"] = l_freq
+            if h_freq is not None:
+                info["lowpass"] = h_freq
+
+        # Only plain values here: BaseRaw deep-copies _raw_extras on copy(),
+        # so the memmap is reopened on every read instead of kept around
+        extras = {
+            "sfreq": sfreq,
+            "columns": columns,
+            "scale": scale,
+            "l_freq": l_freq,
+            "h_freq": h_freq,
+            "notch_freqs": notch_freqs,
+            "method": method,
+            "pad": pad,
+        }
+        super().__init__(
+            info,
+            preload=False,
+            last_samps=(session.num_samples - 1,),
+            filenames=(path,),
+            raw_extras=[extras],
+            orig_format="double",
+            verbose=verbose,
+        )
+
+    def _read_segment_file(self, data, idx, fi, start, stop, cals, mult):
+        extras = self._raw_extras[fi]
+        session = read_session(self._filenames[fi])
+        sfreq = extras["sfreq"]
+
+        first = max(start - extras["pad"], 0)
+        last = min(stop + extras["pad"], session.num_samples)
+        one = np.empty((len(extras["columns"]), last - first), dtype=np.float64)
+        for row, column in zip(one, extras["columns"]):
+            row[:] = session.data[first:last, column]
+        one *= extras["scale"]
+
+        if extras["l_freq"] is not None or extras["h_freq"] is not None:
+            one = mne.filter.filter_data(
+                one,
+                sfreq,
+                extras["l_freq"],
+                extras["h_freq"],
+                method=extras["method"],
+                verbose=False,
+            )
+        if extras["notch_freqs"]:
+            one = mne.filter.notch_filter(
+                one,
+                sfreq,
+                np.asarray(extras["notch_freqs"], dtype=float),
+                method=extras["method"],
+                verbose=False,
+            )
+        one = one[:, start - first : stop - first]
+
+        if mult is not None:
+            data[:] = mult @ one[idx]
+        else:
+            data[:] = one[idx]
+            data *= cals
+
+
+def read_raw_session(path, **kwargs):
+    return RawSession(path, **kwargs)
+
+
+def compute_psd(raw, n_fft=256, chunk_duration=60.0, picks="eeg"):
+    # Welch PSD (no overlap between segments) accumulated over chunks of
+    # chunk_duration seconds, so the whole recording is never in memory at once.
+    # Equal to scipy.signal.welch over the full span with noverlap=0
+    if raw.n_times < n_fft:
+        raise ValueError(
+            f"Recording of {raw.n_times} samples is shorter than n_fft={n_fft}"
+        )
+    picks = mne.pick_types(raw.info, eeg=True) if picks == "eeg" else picks
+    sfreq = raw.info["sfreq"]
+    chunk_size = max(int(chunk_duration * sfreq) // n_fft, 1) * n_fft
+
+    total = None
+    num_segments = 0
+    for start in range(0, raw.n_times - n_fft + 1, chunk_size):
+        stop = min(start + chunk_size, raw.n_times)
+        stop -= (stop - start) % n_fft
+        data = raw.get_data(picks=picks, start=start, stop=stop)
+        freqs, psd = signal.welch(data, sfreq, nperseg=n_fft, noverlap=0)
+        count = (stop - start) // n_fft
+        total = psd * count if total is None else total + psd * count
+        num_segments += count
+
+    return freqs, total / num_segments
@@ -4,6 +4,9 @@ import sys
 import numpy as np
 import logging
 import os
+import queue
+import threading
+from collections import deque
 
 from brainflow.board_shim import (
     BoardShim,
@@ -16,6 +19,8 @@ from datetime import datetime
 from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QMessageBox, QProgressBar
 from PyQt5.QtCore import Qt, QEvent, QTimer
 
+from session_file import SessionBuffer, SessionWriter, default_column_names
+
 
 DEFAULT_CHANNELS = [7]  # C3 channel
 
@@ -28,8 +33,7 @@ class MotorImageryTask(QWidget):
         self.eeg_handler = EEGHandler(
             self.board, self.directory_handler, DEFAULT_CHANNELS
         )
-        self.eeg_handler.setup_and_prepare_session()
-        self.eeg_handler.start_stream()
+        self.eeg_handler.start()
 
         self.trials = 2
         self.trial_count = 0
@@ -80,7 +84,6 @@ class MotorImageryTask(QWidget):
         return
 
     def startTask(self):
-        self.eeg_handler.clear_buffer()
         self.eeg_handler.set_start_time()
         self.showInstruction()
         return
@@ -145,14 +148,19 @@ class MotorImageryTask(QWidget):
 
         self.eeg_handler.start_data_collection(label)
 
+        # Progress follows the clock, not the number of timer ticks, so a late
+        # tick does not stretch the instruction
+        self.instruction_start = time.monotonic()
+        self.wait_time = wait_time
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_progress_bar)
         self.timer.start(10)
 
     def update_progress_bar(self):
-        current_value = self.progress_bar.value()
-        if current_value > 0:
-            self.progress_bar.setValue(current_value - 10)
+        elapsed = int((time.monotonic() - self.instruction_start) * 1000)
+        remaining = self.wait_time - elapsed
+        if remaining > 0:
+            self.progress_bar.setValue(remaining)
         else:
             self.timer.stop()
             self.progress_bar.hide()
@@ -184,18 +192,38 @@ class DirectoryHandler:
 
 
 class EEGHandler:
+    # Runs on its own thread and is the only user of the BoardShim. The GUI
+    # sends label changes through a queue, stamped with time.monotonic(), and
+    # they are applied at the first sample whose board timestamp is at or after
+    # that moment rather than at the next timer tick.
     def __init__(self, board, directory_handler, channels=None):
         self.board = board
-        self.sfreq = self.board.get_sampling_rate(BoardIds.CYTON_BOARD)
+        self.board_id = board.get_board_id()
+        self.sfreq = self.board.get_sampling_rate(self.board_id)
+        self.timestamp_channel = BoardShim.get_timestamp_channel(self.board_id)
         self.directory_handler = directory_handler
         self.start_time = None
-        self.data_storage = []
+        self.session_buffer = None
+        self.spill_interval = 1.0  # seconds of data that can be lost on a crash
+        self.poll_interval = 0.02
         self.file_path = None
         if channels is None:
             self.channels = [1, 2, 3, 4, 5, 6, 7, 8]
         else:
             self.channels = channels
 
+        eeg_channels = BoardShim.get_eeg_channels(self.board_id)
+        self.selected_channels = [eeg_channels[c - 1] for c in self.channels]
+
+        # SimpleQueue put/get do not take a Python-level lock
+        self.commands = queue.SimpleQueue()
+        self.pending_commands = deque()
+        self.current_label = None  # None: samples are not recorded
+        self.clock_offset = time.time() - time.monotonic()
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
     def setup_and_prepare_session(self):
         try:
             self.board.prepare_session()
@@ -207,12 +235,32 @@ class EEGHandler:
         try:
             self.board.start_stream()
             print("Start streaming")
-            print("Sfreq: ", self.board.get_sampling_rate(BoardIds.CYTON_BOARD))
+            print("Sfreq: ", self.sfreq)
+        except BrainFlowError as e:
+            logging.warning(e)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        self.setup_and_prepare_session()
+        self.start_stream()
+
+        try:
+            while not self.stop_event.wait(self.poll_interval):
+                self.collect_data()
+            self.collect_data()
+
         except BrainFlowError as e:
             logging.warning(e)
 
-    def clear_buffer(self):
-        self.board.get_board_data()
+        finally:
+            self.save_data()
+
+            if self.board.is_prepared():
+                self.board.stop_stream()
+                self.board.release_session()
+                print("End of EEG data collection")
 
     def set_start_time(self):
         self.start_time = time.time()
@@ -227,58 +275,83 @@ class EEGHandler:
             os.makedirs(data_dir)
 
         directory_path = self.directory_handler.get_directory_path()
-        file_path = f"{directory_path}/eeg_data.csv"
+        file_path = f"{directory_path}/eeg_data.bin"
 
         self.file_path = file_path
 
+        num_channels = len(self.channels)
+        writer = SessionWriter(
+            file_path,
+            default_column_names(num_channels) + ["timestamp", "label"],
+            self.sfreq,
+            timestamp_column=num_channels,
+            label_column=num_channels + 1,
+        )
+        capacity = int(2 * self.spill_interval * self.sfreq)
+        self.session_buffer = SessionBuffer(writer, capacity, self.spill_interval)
+
     def get_data_file(self):
         return self.file_path
 
     def start_data_collection(self, label):
-        self.current_label = label
-        self.data_collection_timer = QTimer()
-        self.data_collection_timer.timeout.connect(self.collect_data)
-        self.data_collection_timer.start(50)
+        self.commands.put((time.monotonic(), label))
+
+    def stop_data_collection(self):
+        self.commands.put((time.monotonic(), None))
+
+    def label_samples(self, timestamps):
+        while True:
+            try:
+                self.pending_commands.append(self.commands.get_nowait())
+            except queue.Empty:
+                break
+
+        labels = np.full(len(timestamps), np.nan)
+        if self.current_label is not None:
+            labels[:] = self.current_label
+
+        while self.pending_commands and len(timestamps) > 0:
+            command_time, label = self.pending_commands[0]
+            command_time += self.clock_offset
+            if command_time > timestamps[-1]:
+                break
+            position = np.searchsorted(timestamps, command_time)
+            labels[position:] = np.nan if label is None else label
+            self.current_label = label
+            self.pending_commands.popleft()
+
+        return labels
 
     def collect_data(self):
         data = self.board.get_board_data()
+        timestamps = data[self.timestamp_channel]
 
-        eeg_channels = self.board.get_eeg_channels(self.board.board_id)
-        selected_channels = [eeg_channels[c - 1] for c in self.channels]
-        eeg_data = data[selected_channels, :]
-
-        num_samples = eeg_data.shape[1]
-        timestamps = np.arange(num_samples) / self.board.get_sampling_rate(
-            BoardIds.CYTON_BOARD
-        )
-        timestamps += time.time() - self.start_time
+        labels = self.label_samples(timestamps)
+        keep = ~np.isnan(labels)
+        num_samples = np.count_nonzero(keep)
+        if self.session_buffer is None or num_samples == 0:
+            return
 
-        labels = np.full(num_samples, self.current_label)
-        eeg_data_with_labels = np.column_stack((eeg_data.T, timestamps, labels))
+        num_channels = len(self.selected_channels)
 
-        self.data_storage.append(eeg_data_with_labels)
+        # Fill the session buffer in place: channels, timestamp, label
+        block = self.session_buffer.reserve(num_samples)
+        block[:num_channels] = data[self.selected_channels][:, keep]
+        block[num_channels] = timestamps[keep] - self.start_time
+        block[num_channels + 1] = labels[keep]
 
-    def stop_data_collection(self):
-        self.data_collection_timer.stop()
+        self.session_buffer.spill_if_due()
 
     def save_data(self):
-        file_path = self.get_data_file()
-        data = np.concatenate(self.data_storage, axis=0)
-
-        # ラベルの列を整数に変換
-        data[:, -1] = data[:, -1].astype(int)
-
-        # fmt で各列のフォーマットを指定
-        np.savetxt(file_path, data, delimiter=",", fmt=["%.3f", "%.3f", "%d"])
-        print("Data saved to eeg_data.csv")
+        if self.session_buffer is None:
+            return
+        self.session_buffer.close()
+        print("Data saved to eeg_data.bin")
 
     def stop(self):
-        self.save_data()
-
-        if self.board.is_prepared():
-            self.board.stop_stream()
-            self.board.release_session()
-            print("End of EEG data collection")
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
 
         return
 
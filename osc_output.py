@@ -0,0 +1,95 @@
+import logging
+import threading
+from collections import deque
+
+import numpy as np
+from pythonosc import osc_bundle_builder, osc_message_builder, udp_client
+
+
+class OSCStream:
+    # One long-lived UDP client. Every tick's samples go out as a single OSC
+    # bundle with one message per channel, each carrying the new samples as a
+    # big-endian float32 blob. With threaded=True, bundles are sent from a
+    # background thread through a bounded queue that drops the oldest bundle
+    # when the receiver side cannot keep up.
+    # With sequence=True every sample bundle starts with an <address>/seq int
+    # message, so a receiver (osc_receiver.py) can count lost bundles.
+    def __init__(self, ip, port, threaded=False, max_queue=64, sequence=False):
+        self.client = udp_client.UDPClient(ip, port)
+        self.threaded = threaded
+        self.sequence = 0 if sequence else None
+        self.num_sent = 0
+        self.num_dropped = 0
+
+        if threaded:
+            self.queue = deque(maxlen=max_queue)
+            self.ready = threading.Condition()
+            self.running = True
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def build_samples(self, address, data):
+        # data: (num_channels, num_samples) -> bundle with <address>/ch<N> blobs
+        bundle = osc_bundle_builder.OscBundleBuilder(osc_bundle_builder.IMMEDIATELY)
+        if self.sequence is not None:
+            message = osc_message_builder.OscMessageBuilder(address=f"{address}/seq")
+            message.add_arg(self.sequence, arg_type="i")
+            bundle.add_content(message.build())
+            self.sequence += 1
+        blobs = np.ascontiguousarray(data, dtype=">f4")
+        for count, channel_data in enumerate(blobs):
+            message = osc_message_builder.OscMessageBuilder(
+                address=f"{address}/ch{count + 1}"
+            )
+            message.add_arg(channel_data.tobytes(), arg_type="b")
+            bundle.add_content(message.build())
+        return bundle.build()
+
+    def build_message(self, address, values):
+        message = osc_message_builder.OscMessageBuilder(address=address)
+        for value in values:
+            message.add_arg(float(value))
+        return message.build()
+
+    def send_samples(self, address, data):
+        if data.shape[1] == 0:
+            return
+        self.send(self.build_samples(address, data))
+
+    def send_message(self, address, values):
+        self.send(self.build_message(address, values))
+
+    def send(self, content):
+        if not self.threaded:
+            self._send(content)
+            return
+
+        with self.ready:
+            if len(self.queue) == self.queue.maxlen:
+                self.num_dropped += 1
+            self.queue.append(content)
+            self.ready.notify()
+
+    def _send(self, content):
+        try:
+            self.client.send(content)
+            self.num_sent += 1
+        except OSError as e:
+            logging.warning(e)
+
+    def run(self):
+        while True:
+            with self.ready:
+                while self.running and not self.queue:
+                    self.ready.wait()
+                if not self.queue:
+                    return
+                content = self.queue.popleft()
+            self._send(content)
+
+    def close(self):
+        if self.threaded:
+            with self.ready:
+                self.running = False
+                self.ready.notify()
+            self.thread.join()
@@ -0,0 +1,158 @@
+import argparse
+import socket
+import threading
+import time
+
+import numpy as np
+from pythonosc.osc_bundle import OscBundle
+
+from osc_output import OSCStream
+
+# Receiving end of OSCStream for checking throughput and loss:
+#
+#   python osc_receiver.py --port 9000                # listen for a running sender
+#   python osc_receiver.py --self-test --channels 8   # send at the sample rate too
+#
+# Counts bundles, samples and bytes, and reports the gaps in the /seq numbers
+# (the sender needs OSCStream(..., sequence=True)).
+
+
+def receive(port, duration, address="/data", ip="127.0.0.1"):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+    sock.bind((ip, port))
+    sock.settimeout(0.2)
+
+    stats = {
+        "bundles": 0,
+        "samples": 0,
+        "bytes": 0,
+        "lost": 0,
+        "reordered": 0,
+        "first": None,
+        "last": None,
+    }
+    expected = None
+    first_channel = f"{address}/ch1"
+    end = time.monotonic() + duration
+    try:
+        while time.monotonic() < end:
+            try:
+                dgram = sock.recv(65536)
+            except socket.timeout:
+                continue
+            if not OscBundle.dgram_is_bundle(dgram):
+                continue
+
+            stats["last"] = time.monotonic()
+            if stats["first"] is None:
+                stats["first"] = stats["last"]
+            stats["bundles"] += 1
+            stats["bytes"] += len(dgram)
+            for message in OscBundle(dgram):
+                if message.address == f"{address}/seq":
+                    sequence = message.params[0]
+                    if expected is not None and sequence > expected:
+                        stats["lost"] += sequence - expected
+                    elif expected is not None and sequence < expected:
+                        stats["reordered"] += 1
+                    expected = max(sequence + 1, expected or 0)
+                elif message.address == first_channel:
+                    stats["samples"] += len(message.params[0]) // 4
+    finally:
+        sock.close()
+    return stats
+
+
+def send_test_stream(port, channels, sampling_rate, duration, interval=0.05):
+    # Sender side of --self-test: the new samples of every `interval` seconds,
+    # as RealTimePlot_sample.py sends them
+    stream = OSCStream("127.0.0.1", port, threaded=True, sequence=True)
+    data = np.random.default_rng(0).normal(size=(channels, sampling_rate))
+    num_ticks = int(duration / interval)
+    num_sent = 0
+    start = time.monotonic()
+    for tick in range(1, num_ticks + 1):
+        time.sleep(max(0.0, start + tick * interval - time.monotonic()))
+        # Samples due by this tick, so the stream runs at exactly sampling_rate
+        num_due = round(tick * interval * sampling_rate)
+        stream.send_samples("/data", data[:, : num_due - num_sent])
+        num_sent = num_due
+    stream.close()
+    return stream
+
+
+def report(stats, sent=None):
+    if stats["bundles"] < 2:
+        print(f"{stats['bundles']} bundles received")
+        return
+    # Rates over the span between the first and the last bundle, the bundles
+    # after the first one arrived in it
+    duration = stats["last"] - stats["first"]
+    bundle_rate = (stats["bundles"] - 1) / duration
+    sample_rate = stats["samples"] * (stats["bundles"] - 1) / stats["bundles"] / duration
+    print(
+        f"{stats['bundles']} bundles, {stats['samples']} samples/channel, "
+        f"{stats['bytes'] / 1024:.0f} KiB in {duration:.1f} s: "
+        f"{bundle_rate:.1f} bundles/s, {sample_rate:.0f} samples/s per channel"
+    )
+    print(f"lost {stats['lost']} bundles, {stats['reordered']} out of order")
+    if sent is not None:
+        print(
+            f"sender: {sent.num_sent} sent, {sent.num_dropped} dropped from the queue"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--port", type=int, help="port to listen on", required=False, default=9000
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        help="seconds to listen",
+        required=False,
+        default=10.0,
+    )
+    parser.add_argument(
+        "--address", type=str, help="OSC address", required=False, default="/data"
+    )
+    parser.add_argument(
+        "--self-test",
+        action="store_true",
+        help="also run an OSCStream sender at the sampling rate",
+    )
+    parser.add_argument(
+        "--channels",
+        type=int,
+        help="channels sent in --self-test",
+        required=False,
+        default=8,
+    )
+    parser.add_argument(
+        "--sfreq",
+        type=int,
+        help="sampling rate of --self-test",
+        required=False,
+        default=250,
+    )
+    args = parser.parse_args()
+
+    if not args.self_test:
+        report(receive(args.port, args.duration, args.address))
+        return
+
+    result = {}
+    receiver = threading.Thread(
+        target=lambda: result.update(receive(args.port, args.duration + 1.0))
+    )
+    receiver.start()
+    time.sleep(0.2)  # socket bound before the first bundle
+    sent = send_test_stream(args.port, args.channels, args.sfreq, args.duration)
+    receiver.join()
+    report(result, sent)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import time
+import logging
+import numpy as np
+import pandas as pd
+
+from brainflow.board_shim import BoardShim, BoardIds
+
+from convert_sessions import detect_layout
+from event_alignment import (
+    MARKER_CORRECT,
+    MARKER_CUE,
+    MARKER_INCORRECT,
+    align_events,
+)
+from session_file import load_data, read_session
+
+
+def load_recording(path, board_id):
+    # Channel data (num_channels, n) plus timestamps and markers (or None) of a
+    # binary session or of any CSV layout the recorders have written
+    if path.endswith(".bin"):
+        session = read_session(path)
+        channels = [
+            i for i, column in enumerate(session.columns)
+            if column.startswith("channel_")
+        ]
+        data = session.data
+        timestamps = session.timestamps
+        markers = session.markers
+        return (
+            data[:, channels].T,
+            None if timestamps is None else np.array(timestamps),
+            None if markers is None else np.array(markers),
+        )
+
+    layout = detect_layout(path)
+    if layout is None:
+        raise ValueError(f"{path} is empty")
+    if (
+        layout["sep"] == "\t"
+        and not layout["header"]
+        and len(layout["columns"]) == BoardShim.get_num_rows(board_id)
+    ):
+        return load_board_file(path, board_id)
+
+    data = pd.read_csv(
+        path, sep=layout["sep"], header=0 if layout["header"] else None
+    ).values
+    channels = [
+        i for i, column in enumerate(layout["columns"])
+        if column.startswith("channel_")
+    ]
+    timestamps = None
+    if layout["timestamp_column"] is not None:
+        timestamps = data[:, layout["timestamp_column"]]
+    return data[:, channels].T, timestamps, None
+
+
+def load_board_file(path, board_id):
+    # File written by DataFilter.write_file: every board row, tab separated
+    data = load_data(path, sep="\t").T
+    timestamp_channel = BoardShim.get_timestamp_channel(board_id)
+    marker_channel = BoardShim.get_marker_channel(board_id)
+    eeg_channels = BoardShim.get_eeg_channels(board_id)
+    return data[eeg_channels], data[timestamp_channel], data[marker_channel]
+
+
+def load_response_markers(response_path, timestamps, sampling_rate):
+    # Marker channel rebuilt from response_data.csv of task_record*.py: cue
+    # times become MARKER_CUE, key presses MARKER_CORRECT / MARKER_INCORRECT
+    response_df = pd.read_csv(response_path, header=0)
+    reaction_ids = np.where(
+        response_df["correct_responses"].values == 1,
+        MARKER_CORRECT,
+        MARKER_INCORRECT,
+    )
+    event_times = np.concatenate(
+        (response_df["cue_times"].values, response_df["reaction_times"].values)
+    )
+    event_ids = np.concatenate(
+        (np.full(len(response_df), MARKER_CUE), reaction_ids)
+    )
+    events = align_events(timestamps, event_times, event_ids, sampling_rate)
+
+    markers = np.zeros(len(timestamps))
+    markers[events[:, 0]] = events[:, 2]
+    return markers
+
+
+class PlaybackBoard:
+    # Replays a recording through the part of BoardShim the live scripts use.
+    # Samples are released as the playback clock advances:
+    #   speed=1.0   real time
+    #   speed=N     N times faster
+    #   speed=None  as fast as possible, chunk_size more samples on every read
+    # Like BrainFlow, get_board_data() removes what it returns and
+    # get_current_board_data() only looks at what has not been removed yet.
+    # Timestamps are moved onto time.time() at start_stream (scaled by speed),
+    # so code that compares them with its own clock keeps working.
+    get_eeg_channels = staticmethod(BoardShim.get_eeg_channels)
+    get_exg_channels = staticmethod(BoardShim.get_exg_channels)
+    get_sampling_rate = staticmethod(BoardShim.get_sampling_rate)
+
+    def __init__(
+        self,
+        path,
+        board_id=BoardIds.CYTON_BOARD,
+        speed=1.0,
+        response_path=None,
+        chunk_size=None,
+    ):
+        self.path = path
+        self.board_id = board_id
+        self.speed = speed
+        self.sampling_rate = BoardShim.get_sampling_rate(board_id)
+        self.chunk_size = chunk_size or self.sampling_rate // 10
+
+        channels, timestamps, markers = load_recording(path, board_id)
+        num_samples = channels.shape[1]
+
+        if timestamps is None:
+            timestamps = np.arange(num_samples) / self.sampling_rate
+        if response_path is not None:
+            if timestamps[0] < 1e9:
+                logging.warning(
+                    f"{path} has no board timestamps, markers from "
+                    f"{response_path} cannot be aligned"
+                )
+            else:
+                markers = load_response_markers(
+                    response_path, timestamps, self.sampling_rate
+                )
+
+        self.timestamp_channel = BoardShim.get_timestamp_channel(board_id)
+        self.marker_channel = BoardShim.get_marker_channel(board_id)
+        self.eeg_channels = BoardShim.get_eeg_channels(board_id)
+        num_channels = min(len(self.eeg_channels), channels.shape[0])
+
+        self.data = np.zeros((BoardShim.get_num_rows(board_id), num_samples))
+        self.data[self.eeg_channels[:num_channels]] = channels[:num_channels]
+        self.data[BoardShim.get_package_num_channel(board_id)] = (
+            np.arange(num_samples) % 256
+        )
+        self.recorded_timestamps = np.asarray(timestamps, dtype=np.float64)
+        if markers is not None:
+            self.data[self.marker_channel] = markers
+
+        self.prepared = False
+        self.start_time = None
+        self.position = 0  # samples released so far
+        self.read_position = 0  # samples removed by get_board_data
+
+    @property
+    def num_samples(self):
+        return self.data.shape[1]
+
+    @property
+    def finished(self):
+        return self.position >= self.num_samples
+
+    def get_board_id(self):
+        return self.board_id
+
+    def prepare_session(self):
+        self.prepared = True
+
+    def is_prepared(self):
+        return self.prepared
+
+    def start_stream(self, *args):
+        # Resume where a previous stop_stream left off
+        self.start_time = time.monotonic()
+        if self.speed is not None:
+            self.start_time -= self.position / (self.speed * self.sampling_rate)
+        speed = self.speed or 1.0
+        relative = self.recorded_timestamps - self.recorded_timestamps[0]
+        self.data[self.timestamp_channel] = time.time() + relative / speed
+
+    def stop_stream(self):
+        if self.speed is not None:
+            self._advance()
+        self.start_time = None
+
+    def release_session(self):
+        self.prepared = False
+
+    def _advance(self):
+        if self.start_time is None:
+            return
+        if self.speed is None:
+            position = self.position + self.chunk_size
+        else:
+            elapsed = time.monotonic() - self.start_time
+            position = int(elapsed * self.speed * self.sampling_rate)
+        self.position = min(max(self.position, position), self.num_samples)
+
+    def get_board_data_count(self):
+        if self.speed is not None:
+            self._advance()
+        return self.position - self.read_position
+
+    def get_current_board_data(self, num_samples):
+        self._advance()
+        start = max(self.read_position, self.position - num_samples)
+        return self.data[:, start : self.position]
+
+    def get_board_data(self, num_samples=None):
+        self._advance()
+        end = self.position
+        if num_samples is not None:
+            end = min(end, self.read_position + num_samples)
+        data = self.data[:, self.read_position : end].copy()
+        self.read_position = end
+        return data
+
+    def insert_marker(self, value):
+        # Goes into the next sample to be released, as on a real board
+        if self.position < self.num_samples:
+            self.data[self.marker_channel, self.position] = value
@@ -27,6 +27,17 @@ from pythonosc import udp_client, osc_message_builder
 
 import mne
 
+from acquisition import BoardStream
+from frame_worker import FrameWorker
+from latency import LatencyMonitor
+from ring_buffer import RingBuffer
+import spectral
+from playback import PlaybackBoard
+from session_file import SessionWriter, default_column_names
+from shared_ring import SharedBoard
+from streaming_filter import StreamingFilter
+from timeseries_view import FrameTimer
+
 
 class Graph:
     def __init__(self, board_shim):
@@ -34,9 +45,17 @@ class Graph:
         self.board_id = board_shim.get_board_id()
         self.exg_channels = BoardShim.get_exg_channels(self.board_id)[:-1]
         self.sampling_rate = BoardShim.get_sampling_rate(self.board_id)
-        self.update_speed_ms = 50
+        self.update_speed_ms = 30  # rendering
+        self.process_interval_ms = 50
         self.window_size = 4  # seconds
         self.num_points = self.window_size * self.sampling_rate
+        self.stream = BoardStream(board_shim)
+        self.stream.register("plot")
+
+        self.filter = StreamingFilter(len(self.exg_channels), self.sampling_rate)
+        self.filtered = RingBuffer(len(self.exg_channels), self.num_points)
+        # フレーム間 (時間方向) の平滑化、"welch" で直近フレームの平均
+        self.smoother = spectral.SpectrumSmoother(alpha=0.2, mode="ema")
 
         print(f"Sampling Rate: {self.sampling_rate}")
 
@@ -44,13 +63,22 @@ class Graph:
         self.win = pg.GraphicsLayoutWidget(
             show=True, title="BrainFlow Plot", size=(800, 600)
         )
+        # ステージごとの処理時間をオーバーレイに表示、dump_path="latency.csv" で記録
+        self.latency = LatencyMonitor(enabled=True, dump_path=None)
+
+        # 取得・フィルタ・FFTはワーカースレッド、タイマーは描画のみ
+        self.worker = FrameWorker(
+            self.process, self.process_interval_ms / 1000, monitor=self.latency
+        )
         self._init_psd_plots()
 
+        self.worker.start()
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.update)
         self.timer.start(self.update_speed_ms)
 
         self.app.exec_()
+        self.worker.stop()
 
     def _init_psd_plots(self):
         self.psd_plot = self.win.addPlot(title="All Channels FFT")
@@ -58,6 +86,7 @@ class Graph:
         self.psd_plot.setXRange(1, 60)
         self.psd_plot.setLogMode(x=False, y=True)  # Y軸のみ対数スケールに設定
         self.psd_plot.setYRange(np.log10(0.1), np.log10(100))
+        self.frame_timer = FrameTimer(self.psd_plot, extra=self.worker.format)
         self.psd_curves = []
         colors = ["r", "g", "b", "c", "m", "y", "w"]  # 色のリスト
 
@@ -65,57 +94,48 @@ class Graph:
             curve = self.psd_plot.plot(pen=colors[i % len(colors)])  # 色を循環利用
             self.psd_curves.append(curve)
 
-    def apply_smoothing(self, data, alpha=0.9):
-        smoothed_data = np.zeros_like(data)
-        smoothed_data[0] = data[0]
-        for i in range(1, len(data)):
-            smoothed_data[i] = alpha * data[i] + (1 - alpha) * smoothed_data[i - 1]
-        return smoothed_data
+    def process(self):
+        # ワーカースレッドで実行、描画するデータ (freqs, amplitudes) を返す
+        with self.latency.stage("acquire"):
+            new_data = self.stream.read("plot")
+        self.latency.gauge("chunk", new_data.shape[1])
+        if new_data.shape[1] == 0:
+            return None
+        with self.latency.stage("filter"):
+            self.filtered.extend(self.filter.process(new_data[self.exg_channels]))
+        sample_time = new_data[self.stream.timestamp_channel, -1]
+
+        window = self.filtered.get()
+        if window.shape[1] % 2 != 0:
+            window = window[:, 1:]  # データの長さを偶数に調整
+        if window.shape[1] == 0:
+            return None
+
+        with self.latency.stage("spectral"):
+            # 全チャンネルのFFTを一度に計算 (窓関数と周波数軸はキャッシュ済み)
+            fft_amplitudes = np.abs(spectral.windowed_rfft(window))
+            freqs = spectral.get_freqs(window.shape[1], self.sampling_rate)
+
+            # FFTデータの振幅に平滑化を適用 (状態は次のフレームで上書きされるのでコピー)
+            smoothed_fft_amplitudes = self.smoother.update(fft_amplitudes).copy()
+        return freqs, smoothed_fft_amplitudes, sample_time
 
     def update(self):
-        data = self.board_shim.get_current_board_data(self.num_points)
-        for count, channel in enumerate(self.exg_channels):
-            channel_data = data[
-                channel, -self.num_points :
-            ]  # 最新のデータポイントを取得
-            if len(channel_data) % 2 != 0:
-                channel_data = channel_data[:-1]  # データの長さを偶数に調整
-
-            DataFilter.detrend(channel_data, DetrendOperations.CONSTANT.value)
-            DataFilter.perform_bandpass(
-                channel_data,
-                self.sampling_rate,
-                2.0,
-                49.0,
-                2,
-                FilterTypes.BUTTERWORTH.value,
-                0,
-            )
-            DataFilter.perform_bandstop(
-                channel_data,
-                self.sampling_rate,
-                48.0,
-                52.0,
-                2,
-                FilterTypes.BUTTERWORTH.value,
-                0,
-            )
-
-            # FFTを計算
-            fft_data = DataFilter.perform_fft(channel_data, window=WindowOperations.HANNING)
-            # 周波数軸のデータを生成
-            freqs = np.linspace(0, self.sampling_rate / 2, len(fft_data))
-
-            # FFTデータの振幅を計算し、平滑化を適用
-            fft_amplitudes = np.abs(fft_data)
-            smoothed_fft_amplitudes = self.apply_smoothing(fft_amplitudes, alpha=0.9)
-
-            # FFTデータの振幅のみを取得し、プロット
-            self.psd_curves[count].setData(
-                freqs, smoothed_fft_amplitudes
-            )  # FFT振幅を更新
-
-        self.app.processEvents()  # グラフを更新
+        frame = self.worker.take()  # 最新のフレームだけを描画、古いものは捨てる
+        if frame is None:
+            return
+
+        self.frame_timer.start()
+        freqs, smoothed_fft_amplitudes, sample_time = frame
+        with self.latency.stage("render"):
+            for count, channel in enumerate(self.exg_channels):
+                # FFTデータの振幅のみを取得し、プロット
+                self.psd_curves[count].setData(
+                    freqs, smoothed_fft_amplitudes[count]
+                )  # FFT振幅を更新
+        # 最新サンプルのボードタイムスタンプから描画までの遅延
+        self.latency.record("end_to_end", (time.time() - sample_time) * 1000)
+        self.frame_timer.stop()
 
 
 def set_up_board():
@@ -142,7 +162,7 @@ def set_up_board():
         "--ip-address", type=str, help="ip address", required=False, default=""
     )
     parser.add_argument(
-        "--serial-port", type=str, help="serial port", required=True, default=""
+        "--serial-port", type=str, help="serial port", required=False, default=""
     )
     parser.add_argument(
         "--mac-address", type=str, help="mac address", required=False, default=""
@@ -167,9 +187,40 @@ def set_up_board():
         required=False,
     )
     parser.add_argument("--file", type=str, help="file", required=False, default="")
+    parser.add_argument(
+        "--shared-memory",
+        type=str,
+        help="attach to the ring of a running acquisition_daemon.py instead of "
+        "opening the board",
+        required=False,
+        default="",
+    )
+    parser.add_argument(
+        "--playback",
+        type=str,
+        help="replay a recorded eeg_data.csv / .bin instead of opening the board",
+        required=False,
+        default="",
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        help="playback speed, 0 for as fast as possible",
+        required=False,
+        default=1.0,
+    )
     parser.add_argument("--log", action="store_true")
     args = parser.parse_args()
 
+    if args.shared_memory:
+        return SharedBoard(args.shared_memory)
+    if args.playback:
+        return PlaybackBoard(args.playback, speed=args.speed or None)
+    if not args.serial_port:
+        parser.error(
+            "--serial-port is required unless --shared-memory or --playback is given"
+        )
+
     params = BrainFlowInputParams()
     params.ip_port = args.ip_port
     params.serial_port = args.serial_port
@@ -209,9 +260,14 @@ def get_eeg_data(board):
 
         eeg_data = data[eeg_channels, :]
 
-        DataFilter.write_file(eeg_data, "eeg_data.csv", "w")
+        with SessionWriter(
+            "eeg_data.bin",
+            default_column_names(len(eeg_channels)),
+            board.get_sampling_rate(board.board_id),
+        ) as session:
+            session.append(eeg_data)
 
-        print("Data saved to eeg_data.csv")
+        print("Data saved to eeg_data.bin")
 
     except BrainFlowError as e:
         logging.warning("Exception", exc_info=True)
@@ -26,6 +26,17 @@ from pythonosc import udp_client, osc_message_builder
 
 import mne
 
+from acquisition import BoardStream
+from frame_worker import FrameWorker
+from latency import LatencyMonitor
+from ring_buffer import RingBuffer
+import spectral
+from playback import PlaybackBoard
+from session_file import SessionWriter, default_column_names
+from shared_ring import SharedBoard
+from streaming_filter import StreamingFilter
+from timeseries_view import FrameTimer
+
 
 class Graph:
     def __init__(self, board_shim):
@@ -33,9 +44,30 @@ class Graph:
         self.board_id = board_shim.get_board_id()
         self.exg_channels = BoardShim.get_exg_channels(self.board_id)[:-1]
         self.sampling_rate = BoardShim.get_sampling_rate(self.board_id)
-        self.update_speed_ms = 50
+        self.update_speed_ms = 30  # rendering
+        self.process_interval_ms = 50
         self.window_size = 4  # seconds
         self.num_points = self.window_size * self.sampling_rate
+        self.stream = BoardStream(board_shim)
+        self.stream.register("plot")
+
+        self.filter = StreamingFilter(len(self.exg_channels), self.sampling_rate)
+        self.filtered = RingBuffer(len(self.exg_channels), self.num_points)
+
+        # スライディングSTFT: 1秒のセグメントを0.1秒ごとに計算し、4秒分を平均
+        self.use_stft = True
+        self.spectrogram_size = 30  # seconds
+        segment_step = self.sampling_rate // 10
+        self.stft = spectral.SlidingSTFT(
+            len(self.exg_channels),
+            self.sampling_rate,
+            nperseg=self.sampling_rate,
+            step=segment_step,
+            num_average=(self.num_points - self.sampling_rate) // segment_step + 1,
+            num_history=self.spectrogram_size * self.sampling_rate // segment_step,
+        )
+        self.spectrogram = None  # 最新のスペクトログラム画像 (ワーカーで作成)
+        self.shown_spectrogram = None
 
         print(f"Sampling Rate: {self.sampling_rate}")
 
@@ -43,13 +75,23 @@ class Graph:
         self.win = pg.GraphicsLayoutWidget(
             show=True, title="BrainFlow Plot", size=(800, 600)
         )
+        # ステージごとの処理時間をオーバーレイに表示、dump_path="latency.csv" で記録
+        self.latency = LatencyMonitor(enabled=True, dump_path=None)
+
+        # 取得・フィルタ・スペクトル計算はワーカースレッド、タイマーは描画のみ
+        self.worker = FrameWorker(
+            self.process, self.process_interval_ms / 1000, monitor=self.latency
+        )
         self._init_psd_plots()
+        self._init_spectrogram()
 
+        self.worker.start()
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.update)
         self.timer.start(self.update_speed_ms)
 
         self.app.exec_()
+        self.worker.stop()
 
     def _init_psd_plots(self):
         self.psd_plot = self.win.addPlot(title="All Channels PSD")
@@ -57,6 +99,7 @@ class Graph:
         self.psd_plot.setXRange(1, 60)
         self.psd_plot.setLogMode(x=False, y=True)  # Y軸のみ対数スケールに設定
         self.psd_plot.setYRange(np.log10(0.1), np.log10(100))
+        self.frame_timer = FrameTimer(self.psd_plot, extra=self.worker.format)
         self.psd_curves = []
         colors = ['r', 'g', 'b', 'c', 'm', 'y', 'w']  # 色のリスト
 
@@ -64,42 +107,91 @@ class Graph:
             curve = self.psd_plot.plot(pen=colors[i % len(colors)])  # 色を循環利用
             self.psd_curves.append(curve)
 
+    def _init_spectrogram(self):
+        self.win.nextRow()
+        self.spectrogram_plot = self.win.addPlot(title="Spectrogram (channel mean)")
+        self.spectrogram_plot.setLabel("bottom", "Time", units="s")
+        self.spectrogram_plot.setLabel("left", "Frequency", units="Hz")
+        self.spectrogram_plot.setYRange(1, 60)
+
+        self.spectrogram_image = pg.ImageItem(axisOrder="col-major")
+        self.spectrogram_image.setColorMap(pg.colormap.get("viridis"))
+        self.spectrogram_plot.addItem(self.spectrogram_image)
+
+    def compute_spectrogram(self):
+        history = self.stft.spectrogram()
+        if history.shape[-1] == 0:
+            return None
+
+        # (時間, 周波数) の画像、PSDプロットと同じ対数レンジで表示
+        image = np.log10(history.mean(axis=0).T + 1e-12)
+        segment_time = self.stft.step / self.sampling_rate
+        bin_width = self.sampling_rate / self.stft.nperseg
+        rect = QtCore.QRectF(
+            -image.shape[0] * segment_time,
+            -bin_width / 2,
+            image.shape[0] * segment_time,
+            image.shape[1] * bin_width,
+        )
+        return image, rect
+
+    def update_spectrogram(self, spectrogram):
+        image, rect = spectrogram
+        self.spectrogram_image.setImage(
+            image, autoLevels=False, levels=(np.log10(0.1), np.log10(100))
+        )
+        self.spectrogram_image.setRect(rect)
+
+    def process(self):
+        # ワーカースレッドで実行、描画するデータ (freqs, psd, spectrogram) を返す
+        with self.latency.stage("acquire"):
+            new_data = self.stream.read("plot")
+        self.latency.gauge("chunk", new_data.shape[1])
+        if new_data.shape[1] == 0:
+            return None
+        with self.latency.stage("filter"):
+            filtered = self.filter.process(new_data[self.exg_channels])
+            self.filtered.extend(filtered)
+        sample_time = new_data[self.stream.timestamp_channel, -1]
+
+        with self.latency.stage("spectral"):
+            if self.use_stft:
+                # 新しく揃ったセグメントだけをFFT
+                num_segments = self.stft.update(filtered)
+                if num_segments == 0:
+                    return None
+                psd, freqs = self.stft.psd()
+                self.spectrogram = self.compute_spectrogram()
+            else:
+                window = self.filtered.get()
+                if window.shape[1] % 2 != 0:
+                    window = window[:, 1:]  # データの長さを偶数に調整
+                if window.shape[1] == 0:
+                    return None
+
+                # 全チャンネルのPSDを一度に計算
+                psd, freqs = spectral.psd(window, self.sampling_rate)
+
+        return freqs, psd, self.spectrogram, sample_time
 
     def update(self):
-        data = self.board_shim.get_current_board_data(self.num_points)
-        for count, channel in enumerate(self.exg_channels):
-            channel_data = data[channel, -self.num_points :]  # 最新のデータポイントを取得
-            if len(channel_data) % 2 != 0:
-                channel_data = channel_data[:-1]  # データの長さを偶数に調整
-
-            DataFilter.detrend(channel_data, DetrendOperations.CONSTANT.value)
-            DataFilter.perform_bandpass(
-                channel_data,
-                self.sampling_rate,
-                2.0,
-                49.0,
-                2,
-                FilterTypes.BUTTERWORTH.value,
-                0,
-            )
-            DataFilter.perform_bandstop(
-                channel_data,
-                self.sampling_rate,
-                48.0,
-                52.0,
-                2,
-                FilterTypes.BUTTERWORTH.value,
-                0,
-            )
-
-            psd, freqs = DataFilter.get_psd(
-                channel_data,
-                self.sampling_rate,
-                window=1,
-            )
-            self.psd_curves[count].setData(freqs, psd)  # 各チャンネルのPSDデータを更新
-
-        self.app.processEvents()  # グラフを更新
+        frame = self.worker.take()  # 最新のフレームだけを描画、古いものは捨てる
+        if frame is None:
+            return
+
+        self.frame_timer.start()
+        freqs, psd, spectrogram, sample_time = frame
+        with self.latency.stage("render"):
+            for count, channel in enumerate(self.exg_channels):
+                self.psd_curves[count].setData(freqs, psd[count])  # 各チャンネルのPSDデータを更新
+
+            # スペクトログラムは新しいセグメントがあった時だけ描き直す
+            if spectrogram is not None and spectrogram is not self.shown_spectrogram:
+                self.update_spectrogram(spectrogram)
+                self.shown_spectrogram = spectrogram
+        # 最新サンプルのボードタイムスタンプから描画までの遅延
+        self.latency.record("end_to_end", (time.time() - sample_time) * 1000)
+        self.frame_timer.stop()
 
 
 def set_up_board():
@@ -126,7 +218,7 @@ def set_up_board():
         "--ip-address", type=str, help="ip address", required=False, default=""
     )
     parser.add_argument(
-        "--serial-port", type=str, help="serial port", required=True, default=""
+        "--serial-port", type=str, help="serial port", required=False, default=""
     )
     parser.add_argument(
         "--mac-address", type=str, help="mac address", required=False, default=""
@@ -151,9 +243,40 @@ def set_up_board():
         required=False,
     )
     parser.add_argument("--file", type=str, help="file", required=False, default="")
+    parser.add_argument(
+        "--shared-memory",
+        type=str,
+        help="attach to the ring of a running acquisition_daemon.py instead of "
+        "opening the board",
+        required=False,
+        default="",
+    )
+    parser.add_argument(
+        "--playback",
+        type=str,
+        help="replay a recorded eeg_data.csv / .bin instead of opening the board",
+        required=False,
+        default="",
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        help="playback speed, 0 for as fast as possible",
+        required=False,
+        default=1.0,
+    )
     parser.add_argument("--log", action="store_true")
     args = parser.parse_args()
 
+    if args.shared_memory:
+        return SharedBoard(args.shared_memory)
+    if args.playback:
+        return PlaybackBoard(args.playback, speed=args.speed or None)
+    if not args.serial_port:
+        parser.error(
+            "--serial-port is required unless --shared-memory or --playback is given"
+        )
+
     params = BrainFlowInputParams()
     params.ip_port = args.ip_port
     params.serial_port = args.serial_port
@@ -193,9 +316,14 @@ def get_eeg_data(board):
 
         eeg_data = data[eeg_channels, :]
 
-        DataFilter.write_file(eeg_data, "eeg_data.csv", "w")
+        with SessionWriter(
+            "eeg_data.bin",
+            default_column_names(len(eeg_channels)),
+            board.get_sampling_rate(board.board_id),
+        ) as session:
+            session.append(eeg_data)
 
-        print("Data saved to eeg_data.csv")
+        print("Data saved to eeg_data.bin")
 
     except BrainFlowError as e:
         logging.warning("Exception", exc_info=True)
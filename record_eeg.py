@@ -26,6 +26,16 @@ from pythonosc import udp_client, osc_message_builder
 
 import mne
 
+from acquisition import BoardStream
+from frame_worker import FrameWorker
+from latency import LatencyMonitor
+from ring_buffer import RingBuffer
+from playback import PlaybackBoard
+from session_file import SessionWriter, default_column_names
+from shared_ring import SharedBoard
+from streaming_filter import StreamingFilter
+from timeseries_view import FrameTimer, add_timeseries_curve
+
 
 class Graph:
     def __init__(self, board_shim):
@@ -33,9 +43,19 @@ class Graph:
         self.board_id = board_shim.get_board_id()
         self.exg_channels = BoardShim.get_exg_channels(self.board_id)[:-1]
         self.sampling_rate = BoardShim.get_sampling_rate(self.board_id)
-        self.update_speed_ms = 50
+        self.update_speed_ms = 30  # rendering
+        self.process_interval_ms = 50
         self.window_size = 4
         self.num_points = self.window_size * self.sampling_rate
+        self.stream = BoardStream(board_shim)
+        self.stream.register("plot")
+
+        self.filter = StreamingFilter(len(self.exg_channels), self.sampling_rate)
+        self.filtered = RingBuffer(
+            len(self.exg_channels), self.num_points + self.sampling_rate
+        )
+        # x axis is shared by every curve and only sliced when the buffer is filling
+        self.x = np.arange(self.filtered.capacity, dtype=np.float64)
 
         print(f"Sampling Rate: {self.sampling_rate}")
 
@@ -43,13 +63,22 @@ class Graph:
         self.win = pg.GraphicsLayoutWidget(
             show=True, title="BrainFlow Plot", size=(2000, 1000)
         )
+        # Stage timings for the overlay; dump_path="latency.csv" logs them too
+        self.latency = LatencyMonitor(enabled=True, dump_path=None)
+
+        # Acquisition and filtering run on the worker, the timer only draws
+        self.worker = FrameWorker(
+            self.process, self.process_interval_ms / 1000, monitor=self.latency
+        )
         self._init_timeseries()
 
+        self.worker.start()
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.update)
         self.timer.start(self.update_speed_ms)
 
         self.app.exec_()
+        self.worker.stop()
 
     def _init_timeseries(self):
         self.plots = []
@@ -64,37 +93,39 @@ class Graph:
             )
             if i == 0:
                 p.setTitle("TimeSeries Plot")
-            curve = p.plot()
+                self.frame_timer = FrameTimer(p, extra=self.worker.format)
+            curve = add_timeseries_curve(p)
             self.plots.append(p)
             self.curves.append(curve)
 
+    def process(self):
+        # Worker thread. The window is copied because the ring buffer keeps
+        # being written while the GUI draws it
+        with self.latency.stage("acquire"):
+            new_data = self.stream.read("plot")
+        self.latency.gauge("chunk", new_data.shape[1])
+        if new_data.shape[1] == 0:
+            return None
+        with self.latency.stage("filter"):
+            self.filtered.extend(self.filter.process(new_data[self.exg_channels]))
+        # Board timestamp of the newest sample, for the end-to-end latency
+        sample_time = new_data[self.stream.timestamp_channel, -1]
+        return self.filtered.get().copy(), sample_time
+
     def update(self):
-        data = self.board_shim.get_current_board_data(
-            self.num_points + self.sampling_rate
-        )
-        for count, channel in enumerate(self.exg_channels):
-            channel_data = data[channel]
-            DataFilter.detrend(channel_data, DetrendOperations.CONSTANT.value)
-            DataFilter.perform_bandpass(
-                channel_data,
-                self.sampling_rate,
-                2.0,
-                49.0,
-                2,
-                FilterTypes.BUTTERWORTH.value,
-                0,
-            )
-            DataFilter.perform_bandstop(
-                channel_data,
-                self.sampling_rate,
-                48.0,
-                52.0,
-                2,
-                FilterTypes.BUTTERWORTH.value,
-                0,
-            )
-            self.curves[count].setData(channel_data.tolist())
-        self.app.processEvents()  # Update the graph
+        frame = self.worker.take()
+        if frame is None:
+            return
+
+        self.frame_timer.start()
+        window, sample_time = frame
+        with self.latency.stage("render"):
+            x = self.x[: window.shape[1]]
+            for count, channel in enumerate(self.exg_channels):
+                # Each row is a contiguous float64 array, handed over without copying
+                self.curves[count].setData(x, window[count])
+        self.latency.record("end_to_end", (time.time() - sample_time) * 1000)
+        self.frame_timer.stop()
 
 
 def set_up_board():
@@ -121,7 +152,7 @@ def set_up_board():
         "--ip-address", type=str, help="ip address", required=False, default=""
     )
     parser.add_argument(
-        "--serial-port", type=str, help="serial port", required=True, default=""
+        "--serial-port", type=str, help="serial port", required=False, default=""
     )
     parser.add_argument(
         "--mac-address", type=str, help="mac address", required=False, default=""
@@ -146,9 +177,40 @@ def set_up_board():
         required=False,
     )
     parser.add_argument("--file", type=str, help="file", required=False, default="")
+    parser.add_argument(
+        "--shared-memory",
+        type=str,
+        help="attach to the ring of a running acquisition_daemon.py instead of "
+        "opening the board",
+        required=False,
+        default="",
+    )
+    parser.add_argument(
+        "--playback",
+        type=str,
+        help="replay a recorded eeg_data.csv / .bin instead of opening the board",
+        required=False,
+        default="",
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        help="playback speed, 0 for as fast as possible",
+        required=False,
+        default=1.0,
+    )
     parser.add_argument("--log", action="store_true")
     args = parser.parse_args()
 
+    if args.shared_memory:
+        return SharedBoard(args.shared_memory)
+    if args.playback:
+        return PlaybackBoard(args.playback, speed=args.speed or None)
+    if not args.serial_port:
+        parser.error(
+            "--serial-port is required unless --shared-memory or --playback is given"
+        )
+
     params = BrainFlowInputParams()
     params.ip_port = args.ip_port
     params.serial_port = args.serial_port
@@ -213,9 +275,14 @@ def get_eeg_data(board):
 
         eeg_data = data[eeg_channels, :]
 
-        DataFilter.write_file(eeg_data, "eeg_data.csv", "w")
+        with SessionWriter(
+            "eeg_data.bin",
+            default_column_names(len(eeg_channels)),
+            board.get_sampling_rate(board.board_id),
+        ) as session:
+            session.append(eeg_data)
 
-        print("Data saved to eeg_data.csv")
+        print("Data saved to eeg_data.bin")
 
     except BrainFlowError as e:
         logging.warning("Exception", exc_info=True)
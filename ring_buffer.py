@@ -0,0 +1,53 @@
+import numpy as np
+
+
+class RingBuffer:
+    # Fixed-size (num_channels, capacity) buffer. Every sample is written twice
+    # (at i and i + capacity) so the latest window is always a contiguous view.
+    def __init__(self, num_channels, capacity, dtype=np.float64):
+        self.num_channels = num_channels
+        self.capacity = capacity
+        self.buffer = np.zeros((num_channels, 2 * capacity), dtype=dtype)
+        self.index = 0  # position of the oldest sample / next write
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.index = 0
+        self.count = 0
+
+    def extend(self, chunk):
+        num_samples = chunk.shape[1]
+        if num_samples == 0:
+            return
+
+        if num_samples >= self.capacity:
+            chunk = chunk[:, -self.capacity :]
+            self.buffer[:, : self.capacity] = chunk
+            self.buffer[:, self.capacity :] = chunk
+            self.index = 0
+            self.count = self.capacity
+            return
+
+        end = self.index + num_samples
+        if end <= self.capacity:
+            self.buffer[:, self.index : end] = chunk
+            self.buffer[:, self.index + self.capacity : end + self.capacity] = chunk
+        else:
+            split = self.capacity - self.index
+            self.buffer[:, self.index : self.capacity] = chunk[:, :split]
+            self.buffer[:, self.index + self.capacity :] = chunk[:, :split]
+            self.buffer[:, : end - self.capacity] = chunk[:, split:]
+            self.buffer[:, self.capacity : end] = chunk[:, split:]
+
+        self.index = end % self.capacity
+        self.count = min(self.count + num_samples, self.capacity)
+
+    def get(self, num_samples=None):
+        # Latest samples in chronological order, as a view into the buffer
+        if num_samples is None or num_samples > self.count:
+            num_samples = self.count
+        end = self.index + self.capacity
+        return self.buffer[:, end - num_samples : end]
@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import itertools
+import numpy as np
+
+# Binary session layout:
+#   [HEADER_SIZE bytes]  magic + JSON header padded with spaces
+#   [data]               (num_samples, num_columns) C-order matrix of `dtype`
+# Samples are appended row by row, so readers can np.memmap the data block
+# directly. Event markers are a column of the data ("marker", the BrainFlow
+# marker channel), see Session.markers.
+
+MAGIC = b"OBCISESS"
+HEADER_SIZE = 4096
+FORMAT_VERSION = 1
+
+
+def default_column_names(num_channels, timestamp=False, label=False, marker=False):
+    columns = [f"channel_{i + 1}" for i in range(num_channels)]
+    if timestamp:
+        columns = ["timestamp"] + columns
+    if label:
+        columns = columns + ["label"]
+    if marker:
+        columns = columns + ["marker"]
+    return columns
+
+
+def _encode_header(header):
+    text = json.dumps(header).encode("utf-8")
+    if len(MAGIC) + len(text) + 1 > HEADER_SIZE:
+        raise ValueError("Session header does not fit in the reserved block")
+    return MAGIC + text.ljust(HEADER_SIZE - len(MAGIC) - 1) + b"\n"
+
+
+def read_header(path):
+    with open(path, "rb") as file:
+        block = file.read(HEADER_SIZE)
+    if not block.startswith(MAGIC):
+        raise ValueError(f"{path} is not a session file")
+    return json.loads(block[len(MAGIC) :].decode("utf-8"))
+
+
+class SessionWriter:
+    # timestamp column data should stay float64: float32 cannot resolve
+    # sub-second differences in unix time
+    def __init__(
+        self,
+        path,
+        columns,
+        sampling_rate,
+        timestamp_column=None,
+        label_column=None,
+        marker_column=None,
+        dtype="float64",
+        mode="w",
+    ):
+        self.path = path
+
+        if mode == "a" and os.path.exists(path):
+            self.header = read_header(path)
+            if self.header["columns"] != list(columns):
+                raise ValueError(f"{path} was written with different columns")
+            self.file = open(path, "r+b")
+            # Drop a partially written sample left by a crash
+            self.num_samples = self._count_samples()
+            self.file.truncate(HEADER_SIZE + self.num_samples * self.row_size)
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.header = {
+                "version": FORMAT_VERSION,
+                "dtype": np.dtype(dtype).str,
+                "columns": list(columns),
+                "sampling_rate": sampling_rate,
+                "timestamp_column": timestamp_column,
+                "label_column": label_column,
+                "marker_column": marker_column,
+            }
+            self.file = open(path, "wb")
+            self.file.write(_encode_header(self.header))
+            self.num_samples = 0
+
+        self.dtype = np.dtype(self.header["dtype"])
+
+    @property
+    def row_size(self):
+        return len(self.header["columns"]) * np.dtype(self.header["dtype"]).itemsize
+
+    def _count_samples(self):
+        size = os.path.getsize(self.path) - HEADER_SIZE
+        return max(size, 0) // self.row_size
+
+    def append(self, data):
+        # data: (num_columns, num_samples) as returned by BoardShim
+        if data.shape[0] != len(self.header["columns"]):
+            raise ValueError(
+                f"Expected {len(self.header['columns'])} rows, got {data.shape[0]}"
+            )
+        if data.shape[1] == 0:
+            return
+        self.file.write(np.ascontiguousarray(data.T, dtype=self.dtype).tobytes())
+        self.num_samples += data.shape[1]
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class SessionBuffer:
+    # Preallocated (num_columns, capacity) buffer in front of a SessionWriter.
+    # Samples are written into it in place and spilled to disk every
+    # `spill_interval` seconds or when it fills up, so memory stays bounded and
+    # a crash loses at most one interval.
+    def __init__(self, writer, capacity, spill_interval=1.0):
+        self.writer = writer
+        self.num_columns = len(writer.header["columns"])
+        self.buffer = np.empty((self.num_columns, capacity), dtype=np.float64)
+        self.count = 0
+        self.spill_interval = spill_interval
+        self.last_spill = time.monotonic()
+
+    @property
+    def capacity(self):
+        return self.buffer.shape[1]
+
+    def reserve(self, num_samples):
+        # Returns a (num_columns, num_samples) view to fill with the next samples
+        if self.count + num_samples > self.capacity:
+            self.spill()
+        if num_samples > self.capacity:
+            self.buffer = np.empty(
+                (self.num_columns, max(2 * self.capacity, num_samples)),
+                dtype=np.float64,
+            )
+        block = self.buffer[:, self.count : self.count + num_samples]
+        self.count += num_samples
+        return block
+
+    def append(self, data):
+        self.reserve(data.shape[1])[:] = data
+        self.spill_if_due()
+
+    def spill_if_due(self):
+        if time.monotonic() - self.last_spill >= self.spill_interval:
+            self.spill()
+
+    def spill(self):
+        self.last_spill = time.monotonic()
+        if self.count == 0:
+            return
+        self.writer.append(self.buffer[:, : self.count])
+        self.writer.flush()
+        self.count = 0
+
+    def close(self):
+        self.spill()
+        self.writer.close()
+
+
+class Session:
+    # Read-only, zero-copy view of a session file
+    def __init__(self, path):
+        self.path = path
+        self.header = read_header(path)
+        self.columns = self.header["columns"]
+        self.sampling_rate = self.header["sampling_rate"]
+        self.timestamp_column = self.header["timestamp_column"]
+        self.label_column = self.header["label_column"]
+        self.marker_column = self.header.get("marker_column")
+        self.dtype = np.dtype(self.header["dtype"])
+
+        row_size = len(self.columns) * self.dtype.itemsize
+        num_samples = (os.path.getsize(path) - HEADER_SIZE) // row_size
+        if num_samples > 0:
+            self.data = np.memmap(
+                path,
+                dtype=self.dtype,
+                mode="r",
+                offset=HEADER_SIZE,
+                shape=(num_samples, len(self.columns)),
+            )
+        else:
+            self.data = np.empty((0, len(self.columns)), dtype=self.dtype)
+
+    @property
+    def num_samples(self):
+        return self.data.shape[0]
+
+    @property
+    def timestamps(self):
+        if self.timestamp_column is None:
+            return None
+        return self.data[:, self.timestamp_column]
+
+    @property
+    def labels(self):
+        if self.label_column is None:
+            return None
+        return self.data[:, self.label_column]
+
+    @property
+    def markers(self):
+        # BrainFlow marker channel: 0 where no marker was inserted
+        if self.marker_column is None:
+            return None
+        return self.data[:, self.marker_column]
+
+    def column(self, name):
+        return self.data[:, self.columns.index(name)]
+
+
+def read_session(path):
+    return Session(path)
+
+
+def find_data_file(directory, name="eeg_data"):
+    # Prefer the binary session, fall back to the CSV written by older recorders
+    path = os.path.join(directory, f"{name}.bin")
+    if os.path.exists(path):
+        return path
+    return os.path.join(directory, f"{name}.csv")
+
+
+def load_data(path, sep="\t"):
+    # (num_samples, num_columns) array; memory-mapped for binary sessions
+    if path.endswith(".bin"):
+        return read_session(path).data
+
+    import pandas as pd
+
+    return pd.read_csv(path, header=None, sep=sep).values
+
+
+def count_lines(path, block_size=1 << 20):
+    count = 0
+    last = b"\n"
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            count += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        count += 1  # no newline after the last line
+    return count
+
+
+def load_channels(path, columns=None, sep="\t", scale=None, chunk_size=65536):
+    # (len(columns), num_samples) C-contiguous float64 array of the given
+    # columns (indices, or header names for binary sessions), ready to hand to
+    # mne.io.RawArray without another copy. The
+    # result is allocated once and filled in place (CSV lines are parsed
+    # chunk_size at a time, binary sessions read column by column from the
+    # memmap), so peak memory is about the size of the result
+    if path.endswith(".bin"):
+        session = read_session(path)
+        data = session.data
+        if columns is None:
+            columns = range(data.shape[1])
+        columns = [
+            session.columns.index(column) if isinstance(column, str) else column
+            for column in columns
+        ]
+        out = np.empty((len(columns), data.shape[0]), dtype=np.float64)
+        for row, column in zip(out, columns):
+            row[:] = data[:, column]
+    else:
+        if columns is None:
+            with open(path) as file:
+                columns = range(len(file.readline().rstrip("\n").split(sep)))
+        columns = list(columns)
+        num_lines = count_lines(path)
+        out = np.empty((len(columns), num_lines), dtype=np.float64)
+        filled = 0
+        with open(path) as file:
+            while filled < num_lines:
+                block = np.loadtxt(
+                    itertools.islice(file, chunk_size),
+                    delimiter=sep,
+                    usecols=columns,
+                    ndmin=2,
+                )
+                if len(block) == 0:
+                    break
+                out[:, filled : filled + len(block)] = block.T
+                filled += len(block)
+        if filled < num_lines:
+            out = out[:, :filled].copy()  # blank lines were skipped
+
+    if scale is not None:
+        out *= scale
+    return out
@@ -0,0 +1,245 @@
+import logging
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+
+from brainflow.board_shim import BoardShim
+
+# Shared memory layout:
+#   [HEADER_SIZE bytes]  int64 fields, see HEADER_FIELDS
+#   [data]               (num_rows, 2 * capacity) float64, C order
+# "total" counts the samples written so far. The writer only advances it after
+# the samples are in place, so readers never see a half written chunk.
+
+HEADER_FIELDS = (
+    "version",
+    "total",
+    "num_rows",
+    "capacity",
+    "board_id",
+    "sampling_rate",
+    "closed",
+)
+HEADER_SIZE = 64
+FORMAT_VERSION = 1
+
+
+class SharedRing:
+    # Sample ring in a multiprocessing.shared_memory block, written by one
+    # process and read by any number of others. Like RingBuffer every sample is
+    # stored twice, so the latest window is always a contiguous view.
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray(
+            (HEADER_SIZE // 8,), dtype=np.int64, buffer=shm.buf
+        )
+        if self.header[HEADER_FIELDS.index("version")] != FORMAT_VERSION:
+            raise ValueError(f"{shm.name} is not a sample ring")
+
+        self.num_rows = int(self._field("num_rows"))
+        self.capacity = int(self._field("capacity"))
+        self.board_id = int(self._field("board_id"))
+        self.sampling_rate = int(self._field("sampling_rate"))
+        self.buffer = np.ndarray(
+            (self.num_rows, 2 * self.capacity),
+            dtype=np.float64,
+            buffer=shm.buf,
+            offset=HEADER_SIZE,
+        )
+        if not owner:
+            self.header.flags.writeable = False
+            self.buffer.flags.writeable = False
+
+    @classmethod
+    def create(cls, name, num_rows, capacity, board_id, sampling_rate):
+        size = HEADER_SIZE + num_rows * 2 * capacity * 8
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((HEADER_SIZE // 8,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        for field, value in (
+            ("version", FORMAT_VERSION),
+            ("num_rows", num_rows),
+            ("capacity", capacity),
+            ("board_id", board_id),
+            ("sampling_rate", sampling_rate),
+        ):
+            header[HEADER_FIELDS.index(field)] = value
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        shm = shared_memory.SharedMemory(name=name)
+        # Attaching registers the block with this process's resource tracker,
+        # which would unlink it under the writer when the reader exits
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    def _field(self, field):
+        return self.header[HEADER_FIELDS.index(field)]
+
+    @property
+    def total(self):
+        return int(self._field("total"))
+
+    @property
+    def closed(self):
+        return bool(self._field("closed"))
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def extend(self, chunk):
+        # Writer only
+        num_samples = chunk.shape[1]
+        if num_samples == 0:
+            return
+
+        total = self.total
+        if num_samples >= self.capacity:
+            total += num_samples - self.capacity
+            chunk = chunk[:, -self.capacity :]
+            num_samples = self.capacity
+
+        index = total % self.capacity
+        end = index + num_samples
+        if end <= self.capacity:
+            self.buffer[:, index:end] = chunk
+            self.buffer[:, index + self.capacity : end + self.capacity] = chunk
+        else:
+            split = self.capacity - index
+            self.buffer[:, index : self.capacity] = chunk[:, :split]
+            self.buffer[:, index + self.capacity :] = chunk[:, :split]
+            self.buffer[:, : end - self.capacity] = chunk[:, split:]
+            self.buffer[:, self.capacity : end] = chunk[:, split:]
+
+        self.header[HEADER_FIELDS.index("total")] = total + num_samples
+
+    def get(self, num_samples=None):
+        # Latest samples in chronological order, as a view into shared memory.
+        # The view stays valid until the writer has written `capacity` more
+        # samples; check it with lost() after using it if that can happen
+        total = self.total
+        count = min(total, self.capacity)
+        if num_samples is None or num_samples > count:
+            num_samples = count
+        end = total % self.capacity + self.capacity
+        return self.buffer[:, end - num_samples : end]
+
+    def since(self, first_sample):
+        # Samples from sequence number first_sample on (as far as they are still
+        # in the ring) as a view, and the sequence number after the last one
+        total = self.total
+        first = max(first_sample, total - self.capacity)
+        end = total % self.capacity + self.capacity
+        return self.buffer[:, end - (total - first) : end], total
+
+    def lost(self, first_sample):
+        # How many samples from sequence number first_sample on were overwritten
+        return max(0, self.total - self.capacity - first_sample)
+
+    def close(self):
+        if self.owner:
+            self.header[HEADER_FIELDS.index("closed")] = 1
+        self.header = None
+        self.buffer = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # A caller still holds a view; the mapping goes away with the process
+            pass
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class SharedBoard:
+    # Read-only stand-in for BoardShim on top of a SharedRing filled by
+    # acquisition_daemon.py, so BoardStream and the Graph viewers can attach
+    # to a running session instead of opening the serial port themselves.
+    get_eeg_channels = staticmethod(BoardShim.get_eeg_channels)
+    get_exg_channels = staticmethod(BoardShim.get_exg_channels)
+    get_sampling_rate = staticmethod(BoardShim.get_sampling_rate)
+
+    def __init__(self, name):
+        self.name = name
+        self.ring = None
+        self.board_id = None
+        self.cursor = None  # sequence number of the next sample to keep
+        self.chunks = []
+        self.attach()
+
+    def attach(self):
+        self.ring = SharedRing.attach(self.name)
+        self.board_id = self.ring.board_id
+
+    def get_board_id(self):
+        return self.board_id
+
+    def prepare_session(self):
+        if self.ring is None:
+            self.attach()
+
+    def start_stream(self, *args):
+        # Like BoardShim, get_board_data() returns everything from here on
+        self.cursor = self.ring.total
+        self.chunks = []
+
+    def stop_stream(self):
+        self._collect()
+        self.cursor = None
+
+    def _collect(self):
+        # Copy the samples published since the last call out of the ring. The
+        # ring only holds --buffer-seconds of data, so a session longer than
+        # that is kept whole as long as something polls (every viewer tick
+        # does, through get_current_board_data)
+        if self.cursor is None:
+            return
+        first = self.cursor
+        view, self.cursor = self.ring.since(first)
+        chunk = np.array(view)
+        start = self.cursor - chunk.shape[1]
+        # Samples the writer overwrote while they were being copied
+        torn = min(self.ring.lost(start), chunk.shape[1])
+        if start > first or torn > 0:
+            logging.warning(
+                f"{start - first + torn} samples of '{self.name}' were overwritten "
+                "before they were read, the recording has a gap "
+                "(poll more often or raise --buffer-seconds)"
+            )
+            chunk = chunk[:, torn:]
+        if chunk.shape[1] > 0:
+            self.chunks.append(chunk)
+
+    def release_session(self):
+        self.ring.close()
+        self.ring = None
+
+    def is_prepared(self):
+        return self.ring is not None
+
+    def get_board_data_count(self):
+        self._collect()
+        return sum(chunk.shape[1] for chunk in self.chunks)
+
+    def get_current_board_data(self, num_samples):
+        # Zero-copy, read-only view of the latest samples
+        self._collect()
+        return self.ring.get(num_samples)
+
+    def get_board_data(self, num_samples=None):
+        # Samples since start_stream (or the previous call), removed like
+        # BoardShim does. Only this reader's copy is drained, the ring and
+        # other readers are unaffected
+        self._collect()
+        if self.chunks:
+            data = np.concatenate(self.chunks, axis=1)
+        else:
+            data = np.empty((self.ring.num_rows, 0))
+        if num_samples is not None:
+            data, rest = data[:, :num_samples], data[:, num_samples:]
+            self.chunks = [rest] if rest.shape[1] > 0 else []
+        else:
+            self.chunks = []
+        return data
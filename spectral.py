@@ -0,0 +1,167 @@
+from functools import lru_cache
+
+import numpy as np
+from scipy import signal
+
+from ring_buffer import RingBuffer
+
+# Batched spectra for all channels at once. Scaling matches DataFilter.get_psd
+# (|X|^2 / (n * fs), one-sided), so existing plot ranges still apply.
+
+
+@lru_cache(maxsize=32)
+def get_window(window, num_points):
+    # Periodic window, same as BrainFlow's WindowOperations
+    values = signal.get_window(window, num_points, fftbins=True)
+    values.setflags(write=False)
+    return values
+
+
+@lru_cache(maxsize=32)
+def get_freqs(num_points, sampling_rate):
+    freqs = np.fft.rfftfreq(num_points, d=1.0 / sampling_rate)
+    freqs.setflags(write=False)
+    return freqs
+
+
+def windowed_rfft(data, window="hann"):
+    # data: (num_channels, num_points) -> (num_channels, num_points // 2 + 1)
+    num_points = data.shape[-1]
+    return np.fft.rfft(data * get_window(window, num_points), axis=-1)
+
+
+def power_from_spectrum(spectrum, num_points, sampling_rate):
+    power = spectrum.real**2 + spectrum.imag**2
+    power /= num_points * sampling_rate
+    # Fold negative frequencies; DC (and Nyquist for even lengths) appear once
+    stop = power.shape[-1] - 1 if num_points % 2 == 0 else power.shape[-1]
+    power[..., 1:stop] *= 2
+    return power
+
+
+def psd(data, sampling_rate, window="hann"):
+    num_points = data.shape[-1]
+    power = power_from_spectrum(windowed_rfft(data, window), num_points, sampling_rate)
+    return power, get_freqs(num_points, sampling_rate)
+
+
+def welch_psd(data, sampling_rate, nperseg, noverlap=None, window="hann"):
+    # Mean of the per-segment PSDs, segments taken as strided views
+    if noverlap is None:
+        noverlap = nperseg // 2
+    step = nperseg - noverlap
+
+    segments = np.lib.stride_tricks.sliding_window_view(data, nperseg, axis=-1)
+    segments = segments[..., ::step, :]
+    power = power_from_spectrum(
+        windowed_rfft(segments, window), nperseg, sampling_rate
+    )
+    return power.mean(axis=-2), get_freqs(nperseg, sampling_rate)
+
+
+class SpectrumSmoother:
+    # Smooths successive spectra over time, per bin, for all channels at once.
+    #   "ema"    exponential moving average, alpha is the weight of the new frame
+    #   "welch"  average of the last num_frames frames (running sum)
+    def __init__(self, alpha=0.2, mode="ema", num_frames=8):
+        if mode not in ("ema", "welch"):
+            raise ValueError(f"Unknown smoothing mode: {mode}")
+        self.alpha = alpha
+        self.mode = mode
+        self.num_frames = num_frames
+        self.reset()
+
+    def reset(self):
+        self.state = None
+        self.frames = None
+        self.total = None
+        self.index = 0
+        self.count = 0
+
+    def update(self, frame):
+        # Window length (and so the number of bins) changes while the buffer fills
+        if self.state is None or self.state.shape != frame.shape:
+            self.reset()
+            self.state = np.array(frame, dtype=np.float64)
+            if self.mode == "welch":
+                self.frames = np.zeros((self.num_frames,) + frame.shape)
+                self.total = np.zeros(frame.shape)
+            else:
+                return self.state
+
+        if self.mode == "ema":
+            self.state += self.alpha * (frame - self.state)
+            return self.state
+
+        self.total += frame - self.frames[self.index]
+        self.frames[self.index] = frame
+        self.index = (self.index + 1) % self.num_frames
+        self.count = min(self.count + 1, self.num_frames)
+        np.divide(self.total, self.count, out=self.state)
+        return self.state
+
+
+class SlidingSTFT:
+    # Welch PSD over a sliding window that only transforms the segments
+    # completed since the last update. Segment PSDs are kept in a ring buffer,
+    # which also serves as the spectrogram history.
+    def __init__(
+        self,
+        num_channels,
+        sampling_rate,
+        nperseg,
+        step,
+        num_average,
+        num_history=None,
+        window="hann",
+    ):
+        self.num_channels = num_channels
+        self.sampling_rate = sampling_rate
+        self.nperseg = nperseg
+        self.step = step
+        self.num_average = num_average
+        self.window = window
+        self.freqs = get_freqs(nperseg, sampling_rate)
+        self.num_bins = len(self.freqs)
+
+        if num_history is None:
+            num_history = num_average
+        self.segments = RingBuffer(
+            num_channels * self.num_bins, max(num_history, num_average)
+        )
+        self.tail = np.empty((num_channels, 0))
+
+    def update(self, new_samples):
+        # new_samples: (num_channels, n). Returns the number of new segments
+        samples = np.concatenate((self.tail, new_samples), axis=1)
+        num_segments = (samples.shape[1] - self.nperseg) // self.step + 1
+        if num_segments <= 0:
+            self.tail = samples
+            return 0
+
+        segments = np.lib.stride_tricks.sliding_window_view(
+            samples, self.nperseg, axis=-1
+        )[:, : num_segments * self.step : self.step, :]
+        power = power_from_spectrum(
+            windowed_rfft(segments, self.window), self.nperseg, self.sampling_rate
+        )
+        # (channels, segments, bins) -> (channels * bins, segments)
+        self.segments.extend(
+            power.transpose(0, 2, 1).reshape(-1, num_segments)
+        )
+
+        self.tail = samples[:, num_segments * self.step :]
+        return num_segments
+
+    def psd(self):
+        # Mean of the latest num_average segment PSDs, (num_channels, num_bins)
+        latest = self.segments.get(self.num_average)
+        if latest.shape[1] == 0:
+            return np.empty((self.num_channels, 0)), self.freqs[:0]
+        power = latest.reshape(self.num_channels, self.num_bins, -1).mean(axis=-1)
+        return power, self.freqs
+
+    def spectrogram(self):
+        # (num_channels, num_bins, num_segments) view, oldest segment first
+        history = self.segments.get()
+        return history.reshape(self.num_channels, self.num_bins, -1)
@@ -0,0 +1,52 @@
+import numpy as np
+from scipy import signal
+
+
+class StreamingFilter:
+    # Same filters as the DataFilter.perform_bandpass / perform_bandstop calls in
+    # the Graph classes, but as second-order sections with per-channel state so
+    # only new samples are filtered, all channels at once.
+    def __init__(
+        self,
+        num_channels,
+        sampling_rate,
+        bandpass=(2.0, 49.0),
+        bandstop=(48.0, 52.0),
+        order=2,
+    ):
+        self.num_channels = num_channels
+        self.sampling_rate = sampling_rate
+
+        sections = []
+        if bandpass is not None:
+            sections.append(
+                signal.butter(
+                    order, bandpass, btype="bandpass", output="sos", fs=sampling_rate
+                )
+            )
+        if bandstop is not None:
+            sections.append(
+                signal.butter(
+                    order, bandstop, btype="bandstop", output="sos", fs=sampling_rate
+                )
+            )
+        self.sos = np.concatenate(sections, axis=0)
+        self.zi = None  # (num_sections, num_channels, 2)
+
+    def reset(self):
+        self.zi = None
+
+    def process(self, chunk):
+        # chunk: (num_channels, num_samples)
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if chunk.shape[1] == 0:
+            return np.empty_like(chunk)
+
+        if self.zi is None:
+            # Start in steady state for the first sample so the DC offset of the
+            # board does not produce a step transient
+            zi = signal.sosfilt_zi(self.sos)
+            self.zi = zi[:, np.newaxis, :] * chunk[np.newaxis, :, 0, np.newaxis]
+
+        filtered, self.zi = signal.sosfilt(self.sos, chunk, axis=-1, zi=self.zi)
+        return filtered
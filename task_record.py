@@ -28,6 +28,10 @@ from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QMessageBox
 from PyQt5.QtGui import QPainter, QPen
 from PyQt5.QtCore import Qt, QEvent, QTimer
 
+from event_alignment import MARKER_CORRECT, MARKER_CUE, MARKER_INCORRECT
+from latency import LatencyMonitor
+from session_file import SessionWriter, default_column_names
+
 
 class Point:
     def __init__(self, index, x, y, score):
@@ -110,7 +114,6 @@ class PatternLearningTask(QWidget):
 
     def startTask(self):
         self.waiting_for_start = False
-        self.response_handler.start()
         self.eeg_thread.start()
         self.selectRandomTwoPoints()
         self.directory_handler.create_directory()
@@ -132,7 +135,6 @@ class PatternLearningTask(QWidget):
 
     def processKeyPress(self, user_input):
         if user_input in [Qt.Key_L, Qt.Key_O]:
-            self.response_handler.add_reaction_time()
             self.key_event_enabled = False
             is_below_average = self.isSelectedPointsBelowAverage()
 
@@ -140,6 +142,11 @@ class PatternLearningTask(QWidget):
                 user_input == Qt.Key_O and not is_below_average
             )
 
+            # Marker goes straight into the board stream at the key press
+            self.eeg_handler.insert_marker(
+                MARKER_CORRECT if is_correct else MARKER_INCORRECT
+            )
+            self.response_handler.add_reaction_time()
             self.response_handler.add_correct_response(is_correct)
 
             status_text = "Correct" if is_correct else "Incorrect"
@@ -254,6 +261,7 @@ class PatternLearningTask(QWidget):
         selected_points = random.sample(self.points, 2)
         self.key_event_enabled = True
 
+        self.eeg_handler.insert_marker(MARKER_CUE)
         self.response_handler.add_cue_time()
 
         self.selected_points = selected_points
@@ -278,22 +286,17 @@ class DirectoryHandler:
 
 
 class ResponseHandler:
+    # Absolute time.time(), the same clock as the board timestamp channel
     def __init__(self):
-        self.start_time = None
         self.cue_times = []
         self.reaction_times = []
         self.correct_responses = []
 
-    def start(self):
-        self.start_time = time.time()
-
     def add_cue_time(self):
-        current_time = time.time()
-        self.cue_times.append(current_time - self.start_time)
+        self.cue_times.append(time.time())
 
     def add_reaction_time(self):
-        current_time = time.time()
-        self.reaction_times.append(current_time - self.start_time)
+        self.reaction_times.append(time.time())
 
     def add_correct_response(self, is_correct):
         value = 1 if is_correct else 0
@@ -314,18 +317,38 @@ class ResponseHandler:
 
 
 class EEGHandler:
-    def __init__(self, board, directory_handler):
+    def __init__(self, board, directory_handler, interval=0.1, batch_samples=None):
         self.board = board
-        self.stop_signal = False
+        self.board_id = board.get_board_id()
+        self.sampling_rate = BoardShim.get_sampling_rate(self.board_id)
+        self.eeg_channels = BoardShim.get_eeg_channels(self.board_id)
+        self.marker_channel = BoardShim.get_marker_channel(self.board_id)
+        self.timestamp_channel = BoardShim.get_timestamp_channel(self.board_id)
+        self.stop_event = threading.Event()
         self.directory_handler = directory_handler
 
+        # Wake up every `interval` seconds, or once `batch_samples` have arrived
+        if batch_samples is not None:
+            interval = batch_samples / self.sampling_rate
+        self.interval = interval
+
+        self.num_batches = 0
+        self.num_samples = 0
+        self.last_backlog = 0
+        self.max_backlog = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        # Write time, backlog and sample age percentiles, dumped to latency.csv
+        self.latency = LatencyMonitor(enabled=True)
+
     def collect_data(self):
         try:
             self.board.prepare_session()
             self.board.start_stream()
 
             print("Start streaming")
-            print("Sfreq: ", self.board.get_sampling_rate(BoardIds.CYTON_BOARD))
+            print("Sfreq: ", self.sampling_rate)
 
             data_dir = "./data"
 
@@ -333,15 +356,26 @@ class EEGHandler:
                 os.makedirs(data_dir)
 
             directory_path = self.directory_handler.get_directory_path()
-            file_path = f"{directory_path}/eeg_data.csv"
-
-            while not self.stop_signal:
-                data = self.board.get_board_data()
-                eeg_channels = self.board.get_eeg_channels(self.board.board_id)
-
-                eeg_data = data[eeg_channels, :]
-
-                DataFilter.write_file(eeg_data, file_path, "a")
+            file_path = f"{directory_path}/eeg_data.bin"
+            self.latency.dump_path = f"{directory_path}/latency.csv"
+
+            num_channels = len(self.eeg_channels)
+            with SessionWriter(
+                file_path,
+                default_column_names(num_channels, timestamp=True, marker=True),
+                self.sampling_rate,
+                timestamp_column=0,
+                marker_column=num_channels + 1,
+                mode="a",
+            ) as session:
+                # Event.wait sleeps without holding the GIL and returns early on stop
+                while not self.stop_event.wait(self.interval):
+                    self.write_batch(session)
+                    self.latency.maybe_dump()
+                self.write_batch(session)
+            self.latency.dump()
+
+            self.report()
 
         except BrainFlowError as e:
             logging.warning(e)
@@ -353,8 +387,56 @@ class EEGHandler:
                 print("End of EEG data collection")
                 return
 
+    def write_batch(self, session):
+        start = time.perf_counter()
+
+        self.last_backlog = self.board.get_board_data_count()
+        self.max_backlog = max(self.max_backlog, self.last_backlog)
+        self.latency.gauge("backlog", self.last_backlog)
+        if self.last_backlog == 0:
+            return
+
+        data = self.board.get_board_data()
+        # Same layout as task_record_fixed.py: timestamp, channels, marker
+        eeg_data = data[
+            [self.timestamp_channel] + self.eeg_channels + [self.marker_channel], :
+        ]
+
+        with self.latency.stage("write"):
+            session.append(eeg_data)
+            session.flush()
+        # Age of the newest sample once it is on disk
+        self.latency.record(
+            "end_to_end", (time.time() - data[self.timestamp_channel, -1]) * 1000
+        )
+
+        self.last_latency = time.perf_counter() - start
+        self.max_latency = max(self.max_latency, self.last_latency)
+        self.total_latency += self.last_latency
+        self.num_batches += 1
+        self.num_samples += eeg_data.shape[1]
+
+    def insert_marker(self, value):
+        try:
+            self.board.insert_marker(value)
+        except BrainFlowError as e:
+            # The recorder thread has not started streaming yet
+            logging.warning(e)
+
+    def report(self):
+        if self.num_batches == 0:
+            return
+        mean_latency = self.total_latency / self.num_batches
+        print(
+            f"Recorder: {self.num_samples} samples in {self.num_batches} batches, "
+            f"loop latency mean {mean_latency * 1000:.2f} ms / "
+            f"max {self.max_latency * 1000:.2f} ms, "
+            f"max backlog {self.max_backlog} samples"
+        )
+        print(self.latency.format())
+
     def stop(self):
-        self.stop_signal = True
+        self.stop_event.set()
         return
 
 
@@ -27,6 +27,9 @@ from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QMessageBox
 from PyQt5.QtGui import QPainter, QPen
 from PyQt5.QtCore import Qt, QEvent, QTimer
 
+from event_alignment import MARKER_CORRECT, MARKER_CUE, MARKER_INCORRECT
+from session_file import SessionWriter, default_column_names
+
 
 class Point:
     def __init__(self, index, x, y, score):
@@ -85,7 +88,7 @@ class PatternLearningTask(QWidget):
     def closeEvent(self, event):
         logging.info("Closing the application")
         directory_path = self.directory_handler.get_directory_path()
-        file_path = f"{directory_path}/eeg_data.csv"
+        file_path = f"{directory_path}/eeg_data.bin"
         self.eeg_handler.stop(file_path)
         super().closeEvent(event)
 
@@ -129,7 +132,6 @@ class PatternLearningTask(QWidget):
 
     def processKeyPress(self, user_input):
         if user_input in [Qt.Key_L, Qt.Key_O]:
-            self.response_handler.add_reaction_time()
             self.key_event_enabled = False
             is_below_average = self.isSelectedPointsBelowAverage()
 
@@ -137,6 +139,11 @@ class PatternLearningTask(QWidget):
                 user_input == Qt.Key_O and not is_below_average
             )
 
+            # Marker goes straight into the board stream at the key press
+            self.eeg_handler.insert_marker(
+                MARKER_CORRECT if is_correct else MARKER_INCORRECT
+            )
+            self.response_handler.add_reaction_time()
             self.response_handler.add_correct_response(is_correct)
 
             status_text = "Correct" if is_correct else "Incorrect"
@@ -251,6 +258,7 @@ class PatternLearningTask(QWidget):
         selected_points = random.sample(self.points, 2)
         self.key_event_enabled = True
 
+        self.eeg_handler.insert_marker(MARKER_CUE)
         self.response_handler.add_cue_time()
 
         self.selected_points = selected_points
@@ -329,6 +337,12 @@ class EEGHandler:
         except BrainFlowError as e:
             logging.warning(e)
 
+    def insert_marker(self, value):
+        try:
+            self.board.insert_marker(value)
+        except BrainFlowError as e:
+            logging.warning(e)
+
     def stop_stream_and_get_data(self):
         self.board.stop_stream()
 
@@ -337,18 +351,29 @@ class EEGHandler:
 
         timestamp_channel = BoardShim.get_timestamp_channel(self.board_id)
         eeg_channels = BoardShim.get_eeg_channels(self.board_id)
+        marker_channel = BoardShim.get_marker_channel(self.board_id)
 
         timestamps = data[timestamp_channel]
         eeg_data = data[eeg_channels]
+        markers = data[marker_channel]
 
         eeg_data_with_timestamps = np.concatenate(
-            (timestamps.reshape(1, -1), eeg_data), axis=0
+            (timestamps.reshape(1, -1), eeg_data, markers.reshape(1, -1)), axis=0
         )
 
         return eeg_data_with_timestamps
 
     def write_data(self, eeg_data_with_timestamps, file_path):
-        DataFilter.write_file(eeg_data_with_timestamps, file_path, "w")
+        num_channels = eeg_data_with_timestamps.shape[0] - 2
+        columns = default_column_names(num_channels, timestamp=True, marker=True)
+        with SessionWriter(
+            file_path,
+            columns,
+            BoardShim.get_sampling_rate(self.board_id),
+            timestamp_column=0,
+            marker_column=num_channels + 1,
+        ) as session:
+            session.append(eeg_data_with_timestamps)
 
     def stop(self, file_path):
         eeg_data_with_timestamps = self.stop_stream_and_get_data()
@@ -0,0 +1,63 @@
+import time
+
+import pyqtgraph as pg
+
+
+def add_timeseries_curve(plot, pen=None):
+    # Curve for numpy input that is updated every tick: no finite check on the
+    # data, only the visible x range is drawn and, when there are more samples
+    # than pixels, it is reduced to min/max pairs so spikes are kept
+    plot.setClipToView(True)
+    plot.setDownsampling(auto=True, mode="peak")
+    # pen=None passed to plot() hides the line, so keep pyqtgraph's default pen
+    kwargs = {} if pen is None else {"pen": pen}
+    return plot.plot(skipFiniteCheck=True, **kwargs)
+
+
+class FrameTimer:
+    # Overlay with the time spent in update() and the achieved frame rate.
+    # Both are smoothed and the text is redrawn at most every refresh_interval s.
+    # extra() may return more text for the same line, e.g. FrameWorker.format
+    def __init__(self, plot, alpha=0.1, refresh_interval=0.5, extra=None):
+        self.alpha = alpha
+        self.extra = extra
+        self.refresh_interval = refresh_interval
+        self.frame_ms = None
+        self.period_ms = None
+        self.last_start = None
+        self.last_refresh = 0.0
+
+        self.text = pg.TextItem(color="y", anchor=(0, 0))
+        self.text.setParentItem(plot.getViewBox())  # fixed pixel position
+        self.text.setPos(4, 4)
+
+    def _smooth(self, average, value):
+        if average is None:
+            return value
+        return average + self.alpha * (value - average)
+
+    def start(self):
+        now = time.perf_counter()
+        if self.last_start is not None:
+            self.period_ms = self._smooth(
+                self.period_ms, (now - self.last_start) * 1000
+            )
+        self.last_start = now
+
+    def stop(self):
+        now = time.perf_counter()
+        self.frame_ms = self._smooth(self.frame_ms, (now - self.last_start) * 1000)
+
+        if now - self.last_refresh >= self.refresh_interval:
+            self.last_refresh = now
+            self.text.setText(self.format())
+
+    def format(self):
+        text = f"frame {self.frame_ms:.1f} ms"
+        if self.period_ms is not None:
+            text += f" | {1000 / self.period_ms:.1f} fps"
+        if self.extra is not None:
+            extra = self.extra()
+            if extra:
+                text += " | " + extra
+        return text